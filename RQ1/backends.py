@@ -0,0 +1,166 @@
+import asyncio
+import time
+import aiohttp
+from telemetry import generation_telemetry
+
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class HFBackend:
+    # In-process Hugging Face model, as used by the original inference loop
+
+    def __init__(self, model_id, device, prefix=None, early_stopping=None):
+        import torch
+        from transformers import AutoTokenizer, AutoModelForCausalLM
+        from prefix_cache import PrefixCache
+
+        self.torch = torch
+        self.device = device
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        self.model = AutoModelForCausalLM.from_pretrained(model_id).to(device)
+        self.prefix_cache = PrefixCache(self.model, self.tokenizer, prefix, device) if prefix else None
+        self.early_stopping = early_stopping
+
+    # Returns the decoded continuation of the prompt, the generation wall time and its telemetry.
+    # source_code is the code being refactored, used by the brace-balance stopping criterion.
+    def generate(self, prompt, max_new_tokens, source_code=None):
+        from transformers import StoppingCriteriaList
+        from stopping import GenerationTimer, truncate_at_markers
+
+        self.torch.cuda.empty_cache()
+
+        tokenize_start = time.perf_counter()
+        tokens = self.tokenizer.encode(prompt, return_tensors="pt").to(self.device)
+        tokenize_ms = (time.perf_counter() - tokenize_start) * 1000
+
+        timer = GenerationTimer(self.device)
+        stopping_criteria = [timer]
+        stop_monitor = None
+        if self.early_stopping is not None:
+            stop_monitor = self.early_stopping.build(self.tokenizer, tokens.shape[-1], [source_code])
+            stopping_criteria.extend(stop_monitor.criteria)
+
+        generate = self.prefix_cache.generate if self.prefix_cache is not None else self.model.generate
+        timer.start()
+        outputs = generate(tokens, max_new_tokens=max_new_tokens,
+                           pad_token_id=self.tokenizer.eos_token_id, eos_token_id=self.tokenizer.eos_token_id,
+                           stopping_criteria=StoppingCriteriaList(stopping_criteria))
+        timer.stop()
+
+        new_tokens = outputs[0][tokens.shape[-1]:]  # Generated tokens
+        response = self.tokenizer.decode(new_tokens, skip_special_tokens=True)
+        telemetry = generation_telemetry(timer.start_time, timer.first_token_time, timer.end_time,
+                                         tokens.shape[-1], len(new_tokens), tokenize_ms, timer.peak_accelerator_mb())
+        if stop_monitor is not None:
+            telemetry.update(stop_monitor.log(0, max_new_tokens))
+            response = truncate_at_markers(response, self.early_stopping.markers)
+        return response, timer.elapsed, telemetry
+
+    def generate_batch(self, prompts, max_new_tokens, source_codes=None):
+        from batching import generate_batch
+        return generate_batch(self.model, self.tokenizer, prompts, self.device, max_new_tokens,
+                              early_stopping=self.early_stopping, source_codes=source_codes)
+
+
+class CompletionServerBackend:
+    # Asynchronous client for an OpenAI-compatible /v1/completions endpoint (vLLM, TGI, llama.cpp, ...).
+    # One pooled connection per concurrent request; failed requests are retried with exponential backoff.
+
+    def __init__(self, api_base, model_id, concurrency=16, max_retries=5, timeout=600, api_key=None, stop=None):
+        self.stop = stop
+        self.url = api_base.rstrip("/") + "/v1/completions"
+        self.model_id = model_id
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.session = None
+        self.semaphore = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout, headers=self.headers)
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.session.close()
+
+    # Greedy decoding to match the default generate() call of the in-process model
+    async def generate(self, prompt, max_new_tokens, source_code=None):
+        payload = {"model": self.model_id, "prompt": prompt, "max_tokens": max_new_tokens, "temperature": 0}
+        # Server-side equivalent of the template-marker stopping criterion
+        if self.stop:
+            payload["stop"] = self.stop
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.semaphore:
+                    start_time = time.perf_counter()
+                    async with self.session.post(self.url, json=payload) as response:
+                        if response.status >= 400:
+                            message = response.reason
+                            if response.status not in RETRY_STATUSES:
+                                # Keep the server's explanation, e.g. a prompt longer than the model's context
+                                message = " ".join((await response.text()).split())[:500] or message
+                            raise aiohttp.ClientResponseError(response.request_info, response.history,
+                                                              status=response.status, message=message)
+                        body = await response.json()
+                    end_time = time.perf_counter()
+                    # Without streaming, prefill and decode cannot be told apart; token counts come from "usage"
+                    usage = body.get("usage") or {}
+                    telemetry = generation_telemetry(start_time, None, end_time,
+                                                     usage.get("prompt_tokens"), usage.get("completion_tokens"))
+                    return body["choices"][0]["text"], end_time - start_time, telemetry
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # Only dropped connections, timeouts and transient statuses are worth another attempt
+                transient = (isinstance(e, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+                             or (isinstance(e, aiohttp.ClientResponseError) and e.status in RETRY_STATUSES))
+                if not transient or attempt == self.max_retries:
+                    raise
+                # Back off without holding a connection slot
+                delay = min(2 ** attempt, 30)
+                print(f"Request failed ({e}), retrying in {delay} seconds")
+                await asyncio.sleep(delay)
+
+
+# Drive a CompletionServerBackend over all work items, keeping at most 2 * concurrency requests in
+# flight so the item generator is consumed lazily. on_result(item, response, generation_time, telemetry) is
+# called as each request finishes, in completion order. A request that still fails after its retries is
+# passed to on_error(item, error) and the run goes on; returns the number of failed items.
+def run_async(backend, items, max_new_tokens, on_result, on_error=None):
+    failures = 0
+
+    async def generate_item(item):
+        try:
+            response, generation_time, telemetry = await backend.generate(item["prompt"], max_new_tokens, item.get("before_code"))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return item, e
+        return item, (response, generation_time, telemetry)
+
+    async def drain(pending, return_when):
+        nonlocal failures
+        done, pending = await asyncio.wait(pending, return_when=return_when)
+        for task in done:
+            item, outcome = task.result()
+            if isinstance(outcome, Exception):
+                failures += 1
+                if on_error is not None:
+                    on_error(item, outcome)
+                else:
+                    print(f"Generation failed: {outcome!r}")
+            else:
+                on_result(item, *outcome)
+        return pending
+
+    async def run():
+        async with backend:
+            pending = set()
+            for item in items:
+                if len(pending) >= 2 * backend.concurrency:
+                    pending = await drain(pending, asyncio.FIRST_COMPLETED)
+                pending.add(asyncio.create_task(generate_item(item)))
+            if pending:
+                await drain(pending, asyncio.ALL_COMPLETED)
+
+    asyncio.run(run())
+    return failures
@@ -0,0 +1,77 @@
+import time
+import torch
+from transformers import StoppingCriteriaList
+from stopping import GenerationTimer, truncate_at_markers
+from telemetry import generation_telemetry
+
+# How many batches worth of prompts are buffered and sorted by length at a time
+BUCKET_WINDOW = 16
+
+
+# Group work items into batches of similar prompt length so little compute is spent on padding.
+# Items are read lazily: a window of batch_size * window items is tokenized, sorted by length
+# and cut into batches, which keeps memory bounded for the full dataset.
+def iter_length_buckets(items, tokenizer, batch_size, window=BUCKET_WINDOW):
+    buffer = []
+    for item in items:
+        buffer.append(item)
+        if len(buffer) >= batch_size * window:
+            yield from _split_sorted(buffer, tokenizer, batch_size)
+            buffer = []
+    if buffer:
+        yield from _split_sorted(buffer, tokenizer, batch_size)
+
+
+def _split_sorted(buffer, tokenizer, batch_size):
+    lengths = [len(ids) for ids in tokenizer([item["prompt"] for item in buffer])["input_ids"]]
+    order = sorted(range(len(buffer)), key=lambda i: lengths[i])
+    for start in range(0, len(order), batch_size):
+        yield [buffer[i] for i in order[start:start + batch_size]]
+
+
+# Generate for several prompts at once. Decoder-only models continue from the last position,
+# so prompts are left-padded to keep every prompt flush against its generated tokens.
+# Returns the decoded responses, the wall-clock time, the number of generated tokens and
+# per-row telemetry (timings are those of the whole batch, token counts are per row).
+def generate_batch(model, tokenizer, prompts, device, max_new_tokens, early_stopping=None, source_codes=None):
+    tokenizer.padding_side = "left"
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+
+    torch.cuda.empty_cache()
+
+    tokenize_start = time.perf_counter()
+    encoded = tokenizer(prompts, return_tensors="pt", padding=True).to(device)
+    tokenize_ms = (time.perf_counter() - tokenize_start) * 1000
+    prompt_length = encoded["input_ids"].shape[-1]
+
+    timer = GenerationTimer(device)
+    stopping_criteria = [timer]
+    stop_monitor = None
+    if early_stopping is not None:
+        stop_monitor = early_stopping.build(tokenizer, prompt_length, source_codes or [None] * len(prompts))
+        stopping_criteria.extend(stop_monitor.criteria)
+
+    timer.start()
+    outputs = model.generate(**encoded, max_new_tokens=max_new_tokens,
+                             pad_token_id=tokenizer.pad_token_id, eos_token_id=tokenizer.eos_token_id,
+                             stopping_criteria=StoppingCriteriaList(stopping_criteria))
+    timer.stop()
+    generation_time = timer.elapsed
+
+    new_tokens = outputs[:, prompt_length:]
+    row_generated_tokens = (new_tokens != tokenizer.pad_token_id).sum(dim=1).tolist()
+    row_prompt_tokens = encoded["attention_mask"].sum(dim=1).tolist()
+    generated_tokens = sum(row_generated_tokens)
+    peak_accelerator_mb = timer.peak_accelerator_mb()
+    telemetries = [
+        generation_telemetry(timer.start_time, timer.first_token_time, timer.end_time, prompt_tokens, row_tokens,
+                             tokenize_ms, peak_accelerator_mb)
+        for prompt_tokens, row_tokens in zip(row_prompt_tokens, row_generated_tokens)
+    ]
+    responses = tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+    if stop_monitor is not None:
+        for row, telemetry in enumerate(telemetries):
+            telemetry.update(stop_monitor.log(row, max_new_tokens))
+        responses = [truncate_at_markers(response, early_stopping.markers) for response in responses]
+    return responses, generation_time, generated_tokens, telemetries
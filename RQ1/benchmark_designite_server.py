@@ -0,0 +1,79 @@
+import argparse
+import filecmp
+import os
+import shutil
+import subprocess
+import time
+from designite_client import DesigniteServer, compile_server
+from designite_cache import SMELL_FILES
+from run_designite import DESIGNITE_JAR_PATH, designite_command, jvm_options
+
+# Compare one JVM per commit folder with a single long-lived Designite server on the same folders.
+# Both run sequentially, so the difference is the JVM startup and class loading per folder.
+
+def commit_folders(tree, limit):
+    folders = []
+    for project_name in sorted(os.listdir(tree)):
+        project_folder = os.path.join(tree, project_name)
+        if not os.path.isdir(project_folder):
+            continue
+        for commit_sha in sorted(os.listdir(project_folder)):
+            folders.append((project_name, commit_sha))
+            if len(folders) >= limit:
+                return folders
+    return folders
+
+def same_outputs(first_dir, second_dir):
+    for file_name, _ in SMELL_FILES.values():
+        first, second = os.path.join(first_dir, file_name), os.path.join(second_dir, file_name)
+        if os.path.exists(first) != os.path.exists(second):
+            return False
+        if os.path.exists(first) and not filecmp.cmp(first, second, shallow=False):
+            return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark a persistent Designite server against one JVM per folder.')
+    parser.add_argument('tree', nargs='?', default='before_refactoring', help='Tree whose commit folders are analysed')
+    parser.add_argument('--folders', type=int, default=100, help='Number of commit folders to analyse')
+    parser.add_argument('--jar', default=DESIGNITE_JAR_PATH, help='Path to DesigniteJava.jar')
+    parser.add_argument('--java', default='java', help='Java executable')
+    parser.add_argument('--javac', default='javac', help='Java compiler')
+    parser.add_argument('--memory_per_job_mb', type=int, default=2048, help='Heap given to the JVMs')
+    parser.add_argument('--scratch_dir', default='designite_benchmark', help='Directory for the two sets of outputs')
+    args = parser.parse_args()
+
+    folders = commit_folders(args.tree, args.folders)
+    shutil.rmtree(args.scratch_dir, ignore_errors=True)
+    compile_server(args.jar, args.javac)
+
+    command = designite_command(args.java, args.jar, args.memory_per_job_mb, 1)
+    start_time = time.perf_counter()
+    for project_name, commit_sha in folders:
+        output = os.path.join(args.scratch_dir, 'per_folder', project_name, commit_sha)
+        subprocess.run(command + ['-i', os.path.join(args.tree, project_name, commit_sha), '-o', output],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    per_folder_seconds = time.perf_counter() - start_time
+
+    failures = 0
+    start_time = time.perf_counter()
+    with DesigniteServer(args.jar, args.java, args.javac, jvm_options(args.memory_per_job_mb, 1),
+                         max_requests=len(folders) + 1) as server:
+        startup_seconds = time.perf_counter() - start_time
+        for project_name, commit_sha in folders:
+            output = os.path.join(args.scratch_dir, 'server', project_name, commit_sha)
+            ok, _, _ = server.analyse(os.path.join(args.tree, project_name, commit_sha), output)
+            failures += not ok
+    server_seconds = time.perf_counter() - start_time
+
+    mismatches = sum(not same_outputs(os.path.join(args.scratch_dir, 'per_folder', *folder),
+                                      os.path.join(args.scratch_dir, 'server', *folder)) for folder in folders)
+
+    print(f"Folders analysed: {len(folders)}")
+    print(f"One JVM per folder: {per_folder_seconds:.1f} s, {len(folders) / per_folder_seconds:.2f} folders/s")
+    print(f"Persistent server:  {server_seconds:.1f} s including {startup_seconds:.1f} s startup, "
+          f"{len(folders) / server_seconds:.2f} folders/s ({per_folder_seconds / server_seconds:.2f}x)")
+    print(f"Server errors: {failures}, folders with different CSV output: {mismatches}")
+
+if __name__ == "__main__":
+    main()
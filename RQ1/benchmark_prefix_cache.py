@@ -0,0 +1,56 @@
+import argparse
+import statistics
+import time
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM
+from dataset_index import JsonlReader
+from inference import B_SYS, E_SYS, SYSTEM_PROMPT, iter_work_items
+from prefix_cache import PrefixCache
+
+# Compare the prefill cost of each prompt with and without the cached system-prompt prefix.
+# Prefill is measured as a single-token generation, which is dominated by the prompt forward pass.
+
+def time_prefill(generate, tokens, tokenizer):
+    start_time = time.perf_counter()
+    generate(tokens, max_new_tokens=1, pad_token_id=tokenizer.eos_token_id, eos_token_id=tokenizer.eos_token_id)
+    return (time.perf_counter() - start_time) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark prefill time with and without the system-prompt KV cache.')
+    parser.add_argument('--model_id', type=str, default='bigcode/tiny_starcoder_py', help='Model to benchmark, small enough for CPU')
+    parser.add_argument('--device', type=str, default='cpu', help='Device to use')
+    parser.add_argument('--samples', type=int, default=50, help='Number of dataset prompts to time')
+    parser.add_argument('--max_prompt_tokens', type=int, default=1024, help='Skip prompts longer than this many tokens')
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model_id)
+    model = AutoModelForCausalLM.from_pretrained(args.model_id).to(args.device)
+    model.eval()
+
+    start_time = time.perf_counter()
+    prefix_cache = PrefixCache(model, tokenizer, f"{B_SYS}{SYSTEM_PROMPT}{E_SYS}", args.device)
+    setup_ms = (time.perf_counter() - start_time) * 1000
+    print(f"Cached {len(prefix_cache.prefix_ids)} prefix tokens in {setup_ms:.1f} ms")
+
+    baseline_ms = []
+    cached_ms = []
+    with JsonlReader("sampled_dataset.jsonl") as test_file, torch.no_grad():
+        for item in iter_work_items(test_file, 0, set()):
+            tokens = tokenizer.encode(item["prompt"], return_tensors="pt").to(args.device)
+            if tokens.shape[-1] > args.max_prompt_tokens:
+                continue
+
+            baseline_ms.append(time_prefill(model.generate, tokens, tokenizer))
+            cached_ms.append(time_prefill(prefix_cache.generate, tokens, tokenizer))
+            if len(baseline_ms) >= args.samples:
+                break
+
+    baseline_mean = statistics.mean(baseline_ms)
+    cached_mean = statistics.mean(cached_ms)
+    print(f"Prompts timed: {len(baseline_ms)}")
+    print(f"Full prefill:   mean {baseline_mean:.1f} ms, median {statistics.median(baseline_ms):.1f} ms")
+    print(f"Cached prefix:  mean {cached_mean:.1f} ms, median {statistics.median(cached_ms):.1f} ms")
+    print(f"Saving per prompt: {baseline_mean - cached_mean:.1f} ms ({baseline_mean / cached_mean:.2f}x)")
+
+if __name__ == "__main__":
+    main()
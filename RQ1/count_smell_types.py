@@ -1,54 +1,162 @@
 import os
 import csv
-from collections import defaultdict
+import argparse
+import hashlib
+import io
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from smell_distribution import save_distribution_parquet
 
 CODE_SMELL_DIRECTORY = "code_smells"
 OUTPUT_FILE = "code_smell_type_distribution.csv"
+MANIFEST_FILE = "code_smell_type_distribution.manifest.json"
+SMELL_FILES = ['designCodeSmells.csv', 'implementationCodeSmells.csv']
+GROUP_COLUMNS = ['Type Name', 'Code Smell']
+OUTPUT_COLUMNS = ["Project Folder", "Sub Folder", "Type Name", "Code Smell", "Code Smell Count"]
 
-def count_code_smells(directory):
-    overall_distribution = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
-    
+def list_sub_folders(directory):
+    sub_folders = []
     for project_folder in os.listdir(directory):
         project_folder_path = os.path.join(directory, project_folder)
-        
+
         if os.path.isdir(project_folder_path):
             for sub_folder in os.listdir(project_folder_path):
                 sub_folder_path = os.path.join(project_folder_path, sub_folder)
-                
+
                 if os.path.isdir(sub_folder_path):
-                    design_smells_distribution = count_smells_in_file(os.path.join(sub_folder_path, 'designCodeSmells.csv'))
-                    implementation_smells_distribution = count_smells_in_file(os.path.join(sub_folder_path, 'implementationCodeSmells.csv'))
+                    sub_folders.append((project_folder, sub_folder, sub_folder_path))
+    return sub_folders
+
+# Manifest of every CSV counted so far: size, mtime and content hash, plus its partial counts
+def load_manifest(manifest_path, directory):
+    try:
+        with open(manifest_path, 'r') as manifest_file:
+            manifest = json.load(manifest_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    if manifest.get("directory") != os.path.abspath(directory):
+        return {}
+    return manifest.get("files", {})
+
+def save_manifest(manifest_path, directory, files):
+    temporary_path = manifest_path + ".tmp"
+    with open(temporary_path, 'w') as manifest_file:
+        json.dump({"directory": os.path.abspath(directory), "files": files}, manifest_file)
+    os.replace(temporary_path, manifest_path)
+
+def count_code_smells(directory, workers=None, manifest_path=MANIFEST_FILE, full=False):
+    start_time = time.time()
+    workers = workers or os.cpu_count()
+    manifest = {} if full else load_manifest(manifest_path, directory)
+
+    # Only CSVs whose size or mtime differ from the manifest are handed to the workers
+    csv_files = []
+    changed = []
+    for project_folder, sub_folder, sub_folder_path in list_sub_folders(directory):
+        for file_name in SMELL_FILES:
+            file_path = os.path.join(sub_folder_path, file_name)
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                print(f"File not found: {file_path}")
+                continue
+            csv_files.append((project_folder, sub_folder, file_path))
+            entry = manifest.get(file_path)
+            if entry is None or entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+                changed.append((file_path, entry["sha256"] if entry else None))
+
+    rows_read = 0
+    parsed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunksize = max(1, len(changed) // (4 * workers))
+        for (file_path, _), entry in zip(changed, executor.map(count_file, changed, chunksize=chunksize)):
+            if entry["counts"] is None:
+                # Touched but identical content: keep the stored counts
+                entry["counts"] = manifest[file_path]["counts"]
+            else:
+                parsed += 1
+                rows_read += entry["rows"]
+            manifest[file_path] = entry
+    files = {file_path: manifest[file_path] for _, _, file_path in csv_files}
+    save_manifest(manifest_path, directory, files)
+
+    # Merge the partial counts; sort=False keeps every (type, smell) pair at its first appearance,
+    # design smells before implementation smells, as the original nested loops did
+    partial_rows = [(project_folder, sub_folder, type_name, code_smell, count)
+                    for project_folder, sub_folder, file_path in csv_files
+                    for type_name, code_smell, count in files[file_path]["counts"]]
+    partials = pd.DataFrame(partial_rows, columns=OUTPUT_COLUMNS)
+    distribution = partials.groupby(OUTPUT_COLUMNS[:4], sort=False, dropna=False)["Code Smell Count"].sum().reset_index()
 
-                    for (type_name, code_smell), count in design_smells_distribution.items():
-                        overall_distribution[project_folder][sub_folder][(type_name, code_smell)] += count
-                    for (type_name, code_smell), count in implementation_smells_distribution.items():
-                        overall_distribution[project_folder][sub_folder][(type_name, code_smell)] += count
+    elapsed = time.time() - start_time
+    print(f"Parsed {parsed} changed CSVs ({rows_read} smell rows), reused {len(csv_files) - parsed}, "
+          f"in {elapsed:.1f}s ({rows_read / elapsed if elapsed > 0 else 0:.0f} rows/s)")
 
-    save_distribution_to_csv(overall_distribution)
+    save_distribution_to_csv(distribution)
+    return distribution
+
+def count_file(task):
+    file_path, known_sha256 = task
+    stat = os.stat(file_path)
+    with open(file_path, 'rb') as file:
+        data = file.read()
+    entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": hashlib.sha256(data).hexdigest(),
+             "rows": 0, "counts": None}
+    if entry["sha256"] == known_sha256:
+        return entry
+
+    smells = read_smells(file_path, data)
+    counts = smells.groupby(GROUP_COLUMNS, sort=False, dropna=False).size()
+    entry["rows"] = len(smells)
+    entry["counts"] = [[type_name, code_smell, int(count)] for (type_name, code_smell), count in counts.items()]
+    return entry
+
+# Only the two grouping columns are decoded, as plain strings: no type inference and no nulls,
+# so cells such as "TRUE", "NaN", "007" or "" stay exactly as csv.DictReader reads them
+SMELL_CONVERT_OPTIONS = pa_csv.ConvertOptions(
+    include_columns=GROUP_COLUMNS, column_types={column: pa.string() for column in GROUP_COLUMNS},
+    strings_can_be_null=False, quoted_strings_can_be_null=False)
+SMELL_PARSE_OPTIONS = pa_csv.ParseOptions(newlines_in_values=True)
+
+def read_smells(file_path, data):
+    try:
+        table = pa_csv.read_csv(pa.py_buffer(data), parse_options=SMELL_PARSE_OPTIONS, convert_options=SMELL_CONVERT_OPTIONS)
+        return pd.DataFrame({column: table.column(column).to_pylist() for column in GROUP_COLUMNS}, columns=GROUP_COLUMNS)
+    except KeyError as e:
+        print(f"Missing expected column in {file_path}: {e}")
+    except pa.ArrowInvalid:
+        # Ragged or undecodable rows: fall back to the tolerant row-by-row reader
+        return count_smells_in_file(file_path)
+    return pd.DataFrame(columns=GROUP_COLUMNS)
 
 def count_smells_in_file(file_path):
-    smells_distribution = defaultdict(int)
+    rows = []
     try:
-        with open(file_path, mode='r', newline='', encoding='utf-8') as file:
+        with open(file_path, mode='r', newline='', encoding='utf-8', errors='replace') as file:
             reader = csv.DictReader(file)
             for row in reader:
-                type_name = row['Type Name']
-                code_smell = row['Code Smell']
-                smells_distribution[(type_name, code_smell)] += 1
+                rows.append((row['Type Name'], row['Code Smell']))
     except FileNotFoundError:
         print(f"File not found: {file_path}")
     except KeyError as e:
         print(f"Missing expected column in {file_path}: {e}")
-    return smells_distribution
+    return pd.DataFrame(rows, columns=GROUP_COLUMNS)
 
 def save_distribution_to_csv(distribution):
-    with open(OUTPUT_FILE, mode='w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        writer.writerow(["Project Folder", "Sub Folder", "Type Name", "Code Smell", "Code Smell Count"])
-        
-        for project_folder, sub_folders in distribution.items():
-            for sub_folder, type_smells in sub_folders.items():
-                for (type_name, code_smell), count in type_smells.items():
-                    writer.writerow([project_folder, sub_folder, type_name, code_smell, count])
-
-count_code_smells(CODE_SMELL_DIRECTORY)
+    # Same columns, row order and line endings as the csv.writer output of earlier versions
+    distribution.to_csv(OUTPUT_FILE, columns=OUTPUT_COLUMNS, index=False, lineterminator='\r\n', encoding='utf-8')
+    # rq2.py and rq3.py load this columnar copy when it is present
+    save_distribution_parquet(distribution, OUTPUT_FILE)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count the code smells per type in the Designite outputs.")
+    parser.add_argument("--directory", default=CODE_SMELL_DIRECTORY, help="Directory holding <tree>/<project>_smells")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (defaults to the number of CPUs)")
+    parser.add_argument("--manifest", default=MANIFEST_FILE, help="Per-CSV manifest used to recount only changed files")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and parse every CSV")
+    args = parser.parse_args()
+    count_code_smells(args.directory, args.workers, args.manifest, args.full)
@@ -0,0 +1,92 @@
+import argparse
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dataset_index import iter_records
+
+ROW_GROUP_SIZE = 4096
+
+DICT_STRING = pa.dictionary(pa.int32(), pa.string())
+
+# One row per file; commit-level fields are repeated on every file of the commit and
+# dictionary encoding keeps them cheap. line_number and file_index point back into the JSONL.
+# Arrow cannot stream list<dictionary> columns batch by batch, so refactoring types are plain
+# strings here and rely on Parquet's own dictionary pages instead.
+SCHEMA = pa.schema([
+    ("line_number", pa.int32()),
+    ("file_index", pa.int32()),
+    ("project", DICT_STRING),
+    ("commit_sha", DICT_STRING),
+    ("file_name", DICT_STRING),
+    ("refactoring_types", pa.list_(pa.string())),
+    ("refactoring_counts", pa.list_(pa.int32())),
+    ("before_refactoring", pa.string()),
+    ("after_refactoring", pa.string())
+])
+
+
+def columnar_path_for(jsonl_path):
+    return os.path.splitext(jsonl_path)[0] + ".parquet"
+
+
+# Return the Parquet edition of a JSONL dataset if it exists and is not older than the JSONL
+def columnar_edition(jsonl_path):
+    parquet_path = columnar_path_for(jsonl_path)
+    if os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(jsonl_path):
+        return parquet_path
+    return None
+
+
+def _flatten_commit(line_number, data):
+    refactoring_types = data.get("refactoring_types", {})
+    files = data.get("files", [])
+    # Commits without files still get a row so that commit-level data is not lost
+    if not files:
+        files = [{"file_name": None, "before_refactoring": None, "after_refactoring": None}]
+    for file_index, file_data in enumerate(files):
+        yield {
+            "line_number": line_number,
+            "file_index": file_index,
+            "project": data.get("project", ""),
+            "commit_sha": data.get("commit_sha", ""),
+            "file_name": file_data.get("file_name"),
+            "refactoring_types": list(refactoring_types.keys()),
+            "refactoring_counts": list(refactoring_types.values()),
+            "before_refactoring": file_data.get("before_refactoring"),
+            "after_refactoring": file_data.get("after_refactoring")
+        }
+
+
+def convert_to_parquet(jsonl_path, parquet_path=None):
+    parquet_path = parquet_path or columnar_path_for(jsonl_path)
+    rows = []
+    with pq.ParquetWriter(parquet_path, SCHEMA, compression="zstd") as writer:
+        for line_number, data in enumerate(iter_records(jsonl_path)):
+            rows.extend(_flatten_commit(line_number, data))
+            if len(rows) >= ROW_GROUP_SIZE:
+                writer.write_table(pa.Table.from_pylist(rows, schema=SCHEMA))
+                rows = []
+        if rows:
+            writer.write_table(pa.Table.from_pylist(rows, schema=SCHEMA))
+    return parquet_path
+
+
+def column_names(parquet_path):
+    return pq.read_schema(parquet_path).names
+
+
+# Stream rows as dicts, decoding only the requested columns
+def iter_file_rows(parquet_path, columns):
+    parquet_file = pq.ParquetFile(parquet_path)
+    for batch in parquet_file.iter_batches(columns=columns):
+        yield from batch.to_pylist()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the refactoring dataset into a per-file Parquet table.")
+    parser.add_argument("input_file_path", nargs="?", default="sampled_dataset.jsonl", help="Path to the JSONL dataset")
+    parser.add_argument("output_file_path", nargs="?", default=None, help="Path to the Parquet file (defaults to <input>.parquet)")
+    args = parser.parse_args()
+
+    output_path = convert_to_parquet(args.input_file_path, args.output_file_path)
+    print(f"Columnar dataset written to {output_path}")
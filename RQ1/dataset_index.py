@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+
+INDEX_SUFFIX = ".idx.json"
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def index_path_for(jsonl_path):
+    return jsonl_path + INDEX_SUFFIX
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Scan the JSONL file once and record the byte offset at which every line starts
+def build_line_index(jsonl_path):
+    offsets = []
+    position = 0
+    with open(jsonl_path, 'rb') as file:
+        for line in file:
+            offsets.append(position)
+            position += len(line)
+
+    stat = os.stat(jsonl_path)
+    index = {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": file_sha256(jsonl_path),
+        "offsets": offsets
+    }
+    save_line_index(jsonl_path, index)
+    return index
+
+
+# Write the sidecar through a per-process temporary file and os.replace, so concurrent workers never
+# leave a truncated index. When the dataset directory is not writable, the index is only kept in memory.
+def save_line_index(jsonl_path, index):
+    index_path = index_path_for(jsonl_path)
+    temporary_path = f"{index_path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary_path, 'w') as index_file:
+            json.dump(index, index_file)
+        os.replace(temporary_path, index_path)
+    except OSError as e:
+        print(f"Could not save the line index of {jsonl_path} ({e}); using it in memory only")
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
+
+
+# Load the sidecar index, rebuilding it when the dataset changed since it was written.
+# Size and mtime are checked first; the content hash is only recomputed when the mtime moved
+# (e.g. after a copy), so an unchanged dataset never pays for a full read.
+def load_line_index(jsonl_path):
+    index_path = index_path_for(jsonl_path)
+    stat = os.stat(jsonl_path)
+    try:
+        with open(index_path, 'r') as index_file:
+            index = json.load(index_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return build_line_index(jsonl_path)
+
+    if index.get("size") != stat.st_size:
+        return build_line_index(jsonl_path)
+    if index.get("mtime_ns") != stat.st_mtime_ns:
+        if index.get("sha256") != file_sha256(jsonl_path):
+            return build_line_index(jsonl_path)
+        index["mtime_ns"] = stat.st_mtime_ns
+        save_line_index(jsonl_path, index)
+    return index
+
+
+class JsonlReader:
+    # Random-access reader over a JSONL file backed by the persistent line-offset index
+
+    def __init__(self, jsonl_path):
+        self.path = jsonl_path
+        self.offsets = load_line_index(jsonl_path)["offsets"]
+        self._file = open(jsonl_path, 'rb')
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, line_number):
+        self._file.seek(self.offsets[line_number])
+        return json.loads(self._file.readline())
+
+    def iter_from(self, start_line=0, end_line=None):
+        end_line = len(self.offsets) if end_line is None else min(end_line, len(self.offsets))
+        if start_line >= end_line:
+            return
+        self._file.seek(self.offsets[start_line])
+        for line_number in range(start_line, end_line):
+            yield line_number, json.loads(self._file.readline())
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# Convenience generator for scripts that only need to stream records. A sequential scan needs no
+# offsets, so it reads the file directly and never builds or loads the index.
+def iter_records(jsonl_path, start_line=0):
+    with open(jsonl_path, 'rb') as file:
+        for line_number, line in enumerate(file):
+            if line_number >= start_line:
+                yield json.loads(line)
@@ -0,0 +1,192 @@
+import argparse
+import csv
+import os
+import shutil
+import time
+from designite_cache import SMELL_FILES, declared_types, remove_smell_csvs, write_smell_csvs
+from run_designite import CODE_SMELL_DIRECTORY, TREES
+from run_designite import add_runner_arguments, default_workers, run_jobs
+
+
+# Every commit folder of the trees with its number of Java sources, their size and the (package, type name) pairs it declares
+def collect_commit_folders(trees):
+    folders = []
+    for tree_dir in trees:
+        if not os.path.isdir(tree_dir):
+            print(f"Tree not found: {tree_dir}")
+            continue
+        tree = os.path.basename(os.path.normpath(tree_dir))
+        for project_name in sorted(os.listdir(tree_dir)):
+            project_folder = os.path.join(tree_dir, project_name)
+            if not os.path.isdir(project_folder):
+                continue
+            for commit_sha in sorted(os.listdir(project_folder)):
+                commit_folder = os.path.join(project_folder, commit_sha)
+                if not os.path.isdir(commit_folder):
+                    continue
+                size, types, sources = 0, set(), 0
+                for root, _, file_names in os.walk(commit_folder):
+                    for file_name in file_names:
+                        if file_name.endswith(".java"):
+                            sources += 1
+                            path = os.path.join(root, file_name)
+                            size += os.path.getsize(path)
+                            with open(path, encoding="utf-8", errors="replace") as file:
+                                types |= declared_types(file.read())
+                folders.append({"key": (tree, project_name, commit_sha), "path": commit_folder,
+                                "bytes": size, "types": types, "sources": sources})
+    return folders
+
+
+# First-fit decreasing: fill batches up to target_bytes, never putting two commit folders that
+# declare the same (package, type name) in one batch, so every row names a single commit.
+# Folders that declare no type are packed in batches of their own: any row they produce would
+# match no declared type, and keeping them apart leaves the typed batches unambiguous.
+def pack_batches(folders, target_bytes, max_folders):
+    typed = [folder for folder in folders if folder["types"]]
+    untyped = [folder for folder in folders if not folder["types"]]
+    return first_fit_batches(typed, target_bytes, max_folders) + first_fit_batches(untyped, target_bytes, max_folders)
+
+
+def first_fit_batches(folders, target_bytes, max_folders):
+    batches = []
+    for folder in sorted(folders, key=lambda folder: folder["bytes"], reverse=True):
+        for batch in batches:
+            if (batch["bytes"] + folder["bytes"] <= target_bytes and len(batch["folders"]) < max_folders
+                    and not folder["types"] & batch["owners"].keys()):
+                break
+        else:
+            batch = {"bytes": 0, "folders": [], "owners": {}}
+            batches.append(batch)
+        batch["bytes"] += folder["bytes"]
+        batch["folders"].append(folder)
+        for type_key in folder["types"]:
+            batch["owners"][type_key] = folder["key"]
+    return batches
+
+
+# Hard links keep staging cheap; copy when the batch directory is on another file system
+def link_or_copy(source, destination):
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+# A batch of one commit folder; all of its rows belong to that folder
+def single_folder_batch(folder):
+    return {"bytes": folder["bytes"], "folders": [folder], "owners": {type_key: folder["key"] for type_key in folder["types"]}}
+
+
+# Each batch is a synthetic source root holding the files of its commit folders
+def stage_batches(batches, batch_dir, prefix="batch"):
+    jobs = []
+    for index, batch in enumerate(batches):
+        batch["name"] = f"{prefix}{index}"
+        source_root = os.path.join(batch_dir, batch["name"], "src")
+        for folder in batch["folders"]:
+            shutil.copytree(folder["path"], os.path.join(source_root, *folder["key"]), copy_function=link_or_copy)
+        batch["output"] = os.path.join(batch_dir, batch["name"], "smells")
+        jobs.append({"tree": "batches", "project": batch["name"], "input": source_root,
+                     "output": batch["output"], "input_bytes": batch["bytes"]})
+    return jobs
+
+
+# Run the batches and split their rows per commit folder. Returns the rows of the folders whose
+# batch succeeded with every row attributed, the folders whose batch failed, and the multi-folder
+# batches with rows that matched no declared type (e.g. from a folder that declares none).
+def run_batches(batches, batch_dir, prefix, args, workers):
+    jobs = stage_batches(batches, batch_dir, prefix)
+    results = {result["project"]: result for result in run_jobs(jobs, args, workers)}
+    commit_rows, failed_folders, ambiguous = {}, [], []
+    for batch in batches:
+        if results[batch["name"]]["status"] != "ok":
+            failed_folders.extend(batch["folders"])
+            continue
+        batch_rows, unattributed = split_batch_rows(batch)
+        if unattributed:
+            ambiguous.append(batch)
+            continue
+        commit_rows.update(batch_rows)
+    return commit_rows, failed_folders, ambiguous
+
+
+# Split the CSVs of one batch back to (tree, project, commit_sha) keys through the declared types
+def split_batch_rows(batch):
+    commit_rows = {folder["key"]: {kind: [] for kind in SMELL_FILES} for folder in batch["folders"]}
+    unattributed = 0
+    for kind, (file_name, header) in SMELL_FILES.items():
+        path = os.path.join(batch["output"], file_name)
+        if not os.path.exists(path):
+            continue
+        with open(path, mode='r', newline='', encoding='utf-8') as file:
+            for row in csv.DictReader(file):
+                key = batch["owners"].get((row.get("Package Name"), row.get("Type Name")))
+                if key is None and len(batch["folders"]) == 1:
+                    key = batch["folders"][0]["key"]
+                elif key is None:
+                    unattributed += 1
+                    continue
+                # The project name column is rewritten to the commit's own project on output
+                commit_rows[key][kind].append([None] + [row.get(column, "") for column in header[1:]])
+    return commit_rows, unattributed
+
+
+def run_batched_designite(args):
+    start_time = time.time()
+    folders = collect_commit_folders(args.trees)
+    # Designite exits on a source root without Java files, so folders without any are left out
+    batches = pack_batches([folder for folder in folders if folder["sources"]], args.target_bytes, args.max_folders)
+    print(f"Packed {len(folders)} commit folders into {len(batches)} Designite batches")
+
+    shutil.rmtree(args.batch_dir, ignore_errors=True)
+    workers = args.workers or default_workers(args.memory_per_job_mb)
+    commit_rows, failed_folders, ambiguous = run_batches(batches, args.batch_dir, "batch", args, workers)
+
+    # Rows that match no declared type cannot be told apart within a batch, so those batches are
+    # analysed again one commit folder at a time
+    if ambiguous:
+        retry_batches = [single_folder_batch(folder) for batch in ambiguous for folder in batch["folders"]]
+        print(f"{len(ambiguous)} batches had rows matching no declared type; "
+              f"analysing their {len(retry_batches)} commit folders one at a time")
+        retry_rows, retry_failed, _ = run_batches(retry_batches, args.batch_dir, "single", args, workers)
+        commit_rows.update(retry_rows)
+        failed_folders.extend(retry_failed)
+    if not args.keep_batches:
+        shutil.rmtree(args.batch_dir, ignore_errors=True)
+
+    # Reassemble the per-project outputs count_smell_types.py reads. A project with a commit folder
+    # whose run failed gets no CSVs, like a failed direct run, instead of rows that miss that folder.
+    failed_projects = {folder["key"][:2] for folder in failed_folders}
+    projects = {}
+    for folder in folders:
+        tree, project_name, _ = folder["key"]
+        projects.setdefault((tree, project_name), []).append(commit_rows.get(folder["key"], {}))
+    for (tree, project_name), row_sets in projects.items():
+        project_output = os.path.join(args.output_dir, tree, f"{project_name}_smells")
+        if (tree, project_name) in failed_projects:
+            remove_smell_csvs(project_output)
+            continue
+        write_smell_csvs(project_output, project_name, row_sets)
+
+    print(f"Wrote {len(projects) - len(failed_projects)} project outputs in {time.time() - start_time:.1f}s"
+          + (f"; {len(failed_projects)} projects were left without output because the Designite run of "
+             f"{len(failed_folders)} of their commit folders failed" if failed_folders else ""))
+    return len(failed_folders)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run DesigniteJava on commit folders packed into large batches and split the results back per commit.")
+    parser.add_argument("trees", nargs="*", default=TREES, help="Tree directories to analyse")
+    parser.add_argument("--output_dir", default=CODE_SMELL_DIRECTORY, help="Directory receiving <tree>/<project>_smells")
+    parser.add_argument("--batch_dir", default="designite_batches", help="Scratch directory for the synthetic source roots")
+    parser.add_argument("--keep_batches", action="store_true", help="Do not delete the batch directory afterwards")
+    parser.add_argument("--target_bytes", type=int, default=2000000, help="Source size at which a batch is closed")
+    parser.add_argument("--max_folders", type=int, default=2000, help="Maximum commit folders per batch")
+    add_runner_arguments(parser)
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.jar):
+        print(f"DesigniteJava.jar not found at path: {args.jar}")
+        raise SystemExit(1)
+    raise SystemExit(1 if run_batched_designite(args) else 0)
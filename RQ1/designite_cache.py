@@ -0,0 +1,280 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import time
+from dataset_index import file_sha256
+from run_designite import CODE_SMELL_DIRECTORY, TREES
+from run_designite import add_runner_arguments, default_workers, run_jobs
+
+# Designite's CSV outputs and their headers (Designite/utils/Constants in the jar)
+SMELL_FILES = {
+    "design": ("designCodeSmells.csv", ["Project Name", "Package Name", "Type Name", "Code Smell"]),
+    "implementation": ("implementationCodeSmells.csv", ["Project Name", "Package Name", "Type Name", "Method Name", "Code Smell"])
+}
+DEFAULT_PACKAGE = "(default package)"
+
+PACKAGE_PATTERN = re.compile(r"^\s*package\s+([\w.]+)\s*;", re.MULTILINE)
+TYPE_PATTERN = re.compile(r"\b(?:class|interface|enum|record)\s+([A-Za-z_$][\w$]*)")
+
+
+# (package, type name) pairs a source file declares, nested types included. Used to attribute
+# Designite rows back to the file they came from; a name found in a comment only makes the
+# staging rounds below more conservative.
+def declared_types(source):
+    match = PACKAGE_PATTERN.search(source)
+    package = match.group(1) if match else DEFAULT_PACKAGE
+    return {(package, type_name) for type_name in TYPE_PATTERN.findall(source)}
+
+
+class DesigniteCache:
+    # Designite rows of single Java files keyed by the SHA-256 of the source and of the jar,
+    # so identical files in different trees (or runs) are analysed once
+
+    def __init__(self, db_path, jar_hash):
+        self.jar_hash = jar_hash
+        self.connection = sqlite3.connect(db_path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS file_smells ("
+            "source_hash TEXT NOT NULL, jar_hash TEXT NOT NULL, rows TEXT NOT NULL, created REAL, "
+            "PRIMARY KEY (source_hash, jar_hash))")
+        self.connection.commit()
+
+    def cached_hashes(self):
+        return {row[0] for row in self.connection.execute(
+            "SELECT source_hash FROM file_smells WHERE jar_hash = ?", (self.jar_hash,))}
+
+    def get(self, source_hash):
+        row = self.connection.execute(
+            "SELECT rows FROM file_smells WHERE source_hash = ? AND jar_hash = ?",
+            (source_hash, self.jar_hash)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    # rows maps "design"/"implementation" to lists of CSV rows
+    def put_many(self, file_rows):
+        now = time.time()
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO file_smells (source_hash, jar_hash, rows, created) VALUES (?, ?, ?, ?)",
+            ((source_hash, self.jar_hash, json.dumps(rows), now) for source_hash, rows in file_rows.items()))
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+# Every Java file of the trees: (tree, project, path, source hash), plus the source of each hash
+def scan_trees(trees):
+    files = []
+    sources = {}
+    for tree_dir in trees:
+        if not os.path.isdir(tree_dir):
+            print(f"Tree not found: {tree_dir}")
+            continue
+        tree = os.path.basename(os.path.normpath(tree_dir))
+        for project_name in sorted(os.listdir(tree_dir)):
+            project_folder = os.path.join(tree_dir, project_name)
+            if not os.path.isdir(project_folder):
+                continue
+            for root, dirs, file_names in os.walk(project_folder):
+                dirs.sort()
+                for file_name in sorted(file_names):
+                    if not file_name.endswith(".java"):
+                        continue
+                    path = os.path.join(root, file_name)
+                    with open(path, "rb") as file:
+                        content = file.read()
+                    source_hash = hashlib.sha256(content).hexdigest()
+                    sources.setdefault(source_hash, content)
+                    files.append((tree, project_name, path, source_hash))
+    return files, sources
+
+
+# Split the files missing from the cache into staging rounds, per project, such that no
+# (package, type name) is declared twice within a round and every row can be attributed.
+# Files that declare no type (e.g. hunks that are not brace-balanced) share rounds of their own:
+# any row they produce matches no declared type, and keeping them apart leaves the typed rounds
+# unambiguous.
+def plan_rounds(files, sources, cached_hashes):
+    rounds = []
+    project_rounds = {}
+    seen = set(cached_hashes)
+    for _, project_name, _, source_hash in files:
+        if source_hash in seen:
+            continue
+        seen.add(source_hash)
+        types = declared_types(sources[source_hash].decode("utf-8", errors="replace"))
+        for staged in project_rounds.setdefault((project_name, bool(types)), []):
+            if not types & staged["types"]:
+                break
+        else:
+            staged = {"project": project_name, "types": set(), "files": {}, "hashes": []}
+            project_rounds[(project_name, bool(types))].append(staged)
+            rounds.append(staged)
+        staged["types"] |= types
+        for type_key in types:
+            staged["files"][type_key] = source_hash
+        staged["hashes"].append(source_hash)
+    return rounds
+
+
+# A round of one file of staged; all of its rows belong to that file
+def single_file_round(staged, source_hash):
+    files = {type_key: file_hash for type_key, file_hash in staged["files"].items() if file_hash == source_hash}
+    return {"project": staged["project"], "types": set(files), "files": files, "hashes": [source_hash]}
+
+
+def stage_rounds(rounds, sources, staging_dir, prefix="round"):
+    jobs = []
+    for index, staged in enumerate(rounds):
+        staged["name"] = f"{prefix}{index}"
+        round_dir = os.path.join(staging_dir, staged["name"])
+        # The staged folder is named after the project, as in a direct run
+        input_dir = os.path.join(round_dir, "src", staged["project"])
+        os.makedirs(input_dir, exist_ok=True)
+        for source_hash in staged["hashes"]:
+            with open(os.path.join(input_dir, f"{source_hash}.java"), "wb") as file:
+                file.write(sources[source_hash])
+        staged["output"] = os.path.join(round_dir, "smells")
+        jobs.append({"tree": staged["name"], "project": staged["project"], "input": input_dir,
+                     "output": staged["output"], "input_bytes": 0})
+    return jobs
+
+
+# Run the rounds and split their rows per source file. Returns the rows of the files whose round
+# succeeded with every row attributed, and the multi-file rounds with rows that matched no
+# declared type. Files of failed or ambiguous rounds are left out, so they are never cached
+# with rows missing.
+def run_rounds(rounds, sources, staging_dir, prefix, args, workers):
+    jobs = stage_rounds(rounds, sources, staging_dir, prefix)
+    results = {result["tree"]: result for result in run_jobs(jobs, args, workers)}
+    file_rows, ambiguous = {}, []
+    for staged in rounds:
+        if results[staged["name"]]["status"] != "ok":
+            continue  # not cached, so the next run retries these files
+        round_rows, unattributed = attribute_rows(staged)
+        if unattributed:
+            ambiguous.append(staged)
+            continue
+        file_rows.update(round_rows)
+    return file_rows, ambiguous
+
+
+# Split the CSVs of one staged run into rows per source file. The project name column is
+# stored as None when it is the staged folder name, and filled in again on reassembly.
+def attribute_rows(staged):
+    file_rows = {source_hash: {kind: [] for kind in SMELL_FILES} for source_hash in staged["hashes"]}
+    unattributed = 0
+    for kind, (file_name, header) in SMELL_FILES.items():
+        path = os.path.join(staged["output"], file_name)
+        if not os.path.exists(path):
+            continue
+        with open(path, mode='r', newline='', encoding='utf-8') as file:
+            for row in csv.DictReader(file):
+                source_hash = staged["files"].get((row.get("Package Name"), row.get("Type Name")))
+                if source_hash is None and len(staged["hashes"]) == 1:
+                    source_hash = staged["hashes"][0]
+                if source_hash is None:
+                    unattributed += 1
+                    continue
+                values = [row.get(column, "") for column in header]
+                if values[0] == staged["project"]:
+                    values[0] = None
+                file_rows[source_hash][kind].append(values)
+    return file_rows, unattributed
+
+
+# Write one project's designCodeSmells.csv and implementationCodeSmells.csv from row sets
+# mapping "design"/"implementation" to rows whose project name may be None
+def write_smell_csvs(project_output, project_name, row_sets):
+    os.makedirs(project_output, exist_ok=True)
+    for kind, (file_name, header) in SMELL_FILES.items():
+        with open(os.path.join(project_output, file_name), mode='w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(header)
+            for rows in row_sets:
+                for values in rows.get(kind, []):
+                    writer.writerow([project_name if values[0] is None else values[0]] + values[1:])
+
+
+# A project with files whose Designite run failed gets no CSVs at all, like a failed direct run,
+# so count_smell_types.py reports it as missing instead of counting the absent rows as zero smells
+def remove_smell_csvs(project_output):
+    for file_name, _ in SMELL_FILES.values():
+        path = os.path.join(project_output, file_name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def write_tree_outputs(files, cache, output_dir):
+    projects = {}
+    for tree, project_name, _, source_hash in files:
+        projects.setdefault((tree, project_name), []).append(source_hash)
+
+    missing = 0
+    incomplete = 0
+    for (tree, project_name), hashes in projects.items():
+        project_output = os.path.join(output_dir, tree, f"{project_name}_smells")
+        cached = [cache.get(source_hash) for source_hash in hashes]
+        if any(rows is None for rows in cached):
+            missing += sum(rows is None for rows in cached)
+            incomplete += 1
+            remove_smell_csvs(project_output)
+            continue
+        write_smell_csvs(project_output, project_name, cached)
+    return len(projects) - incomplete, incomplete, missing
+
+
+def run_cached_designite(args):
+    start_time = time.time()
+    cache = DesigniteCache(args.cache, file_sha256(args.jar))
+
+    files, sources = scan_trees(args.trees)
+    rounds = plan_rounds(files, sources, cache.cached_hashes())
+    misses = sum(len(staged["hashes"]) for staged in rounds)
+    print(f"{len(files)} Java files, {len(sources)} distinct, {misses} not in the cache; staging {len(rounds)} Designite runs")
+
+    if rounds:
+        shutil.rmtree(args.staging_dir, ignore_errors=True)
+        jobs = stage_rounds(rounds, sources, args.staging_dir)
+        workers = args.workers or default_workers(args.memory_per_job_mb)
+        file_rows, ambiguous = run_rounds(rounds, sources, args.staging_dir, "round", args, workers)
+        cache.put_many(file_rows)
+
+        # Rows that match no declared type cannot be told apart within a round, so those rounds
+        # are analysed again one file at a time
+        if ambiguous:
+            retry_rounds = [single_file_round(staged, source_hash) for staged in ambiguous for source_hash in staged["hashes"]]
+            print(f"{len(ambiguous)} rounds had rows matching no declared type; "
+                  f"analysing their {len(retry_rounds)} files one at a time")
+            retry_rows, _ = run_rounds(retry_rounds, sources, args.staging_dir, "single", args, workers)
+            cache.put_many(retry_rows)
+        if not args.keep_staging:
+            shutil.rmtree(args.staging_dir, ignore_errors=True)
+
+    projects, incomplete, missing = write_tree_outputs(files, cache, args.output_dir)
+    cache.close()
+    print(f"Wrote {projects} project outputs in {time.time() - start_time:.1f}s"
+          + (f"; {incomplete} projects were left without output because the Designite run of "
+             f"{missing} of their files failed" if missing else ""))
+    return missing
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run DesigniteJava only on Java files not analysed before, and rebuild the per-tree outputs from the cache.")
+    parser.add_argument("trees", nargs="*", default=TREES, help="Tree directories to analyse")
+    parser.add_argument("--cache", default="designite_cache.sqlite", help="SQLite cache of per-file Designite rows")
+    parser.add_argument("--output_dir", default=CODE_SMELL_DIRECTORY, help="Directory receiving <tree>/<project>_smells")
+    parser.add_argument("--staging_dir", default="designite_staging", help="Scratch directory for the files to analyse")
+    parser.add_argument("--keep_staging", action="store_true", help="Do not delete the staging directory afterwards")
+    add_runner_arguments(parser)
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.jar):
+        print(f"DesigniteJava.jar not found at path: {args.jar}")
+        raise SystemExit(1)
+    raise SystemExit(1 if run_cached_designite(args) else 0)
@@ -0,0 +1,163 @@
+import os
+import queue
+import subprocess
+import threading
+import time
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "designite_server")
+SERVER_SOURCE = os.path.join(SERVER_DIR, "DesigniteServer.java")
+BUILD_DIR = os.path.join(SERVER_DIR, "build")
+STARTUP_TIMEOUT = 120
+
+
+# Compile the shim against the jar once; recompiled when the source is newer than the class
+def compile_server(jar, javac="javac"):
+    class_file = os.path.join(BUILD_DIR, "DesigniteServer.class")
+    if not os.path.exists(class_file) or os.path.getmtime(class_file) < os.path.getmtime(SERVER_SOURCE):
+        os.makedirs(BUILD_DIR, exist_ok=True)
+        subprocess.run([javac, "-cp", jar, "-d", BUILD_DIR, SERVER_SOURCE], check=True)
+    return BUILD_DIR
+
+
+class DesigniteServer:
+    # One long-lived JVM running designite_server/DesigniteServer.java. analyse() sends a folder
+    # pair and waits for the answer line. A server that dies (Designite can call System.exit) or
+    # times out is restarted on the next request, and it is also recycled every max_requests
+    # analyses so heap growth across thousands of folders stays bounded.
+
+    def __init__(self, jar, java="java", javac="javac", jvm_options=(), log_path=os.devnull, max_requests=500):
+        self.jar = os.path.abspath(jar)
+        self.java = java
+        self.javac = javac
+        self.jvm_options = list(jvm_options)
+        self.log_path = log_path
+        self.max_requests = max_requests
+        self.process = None
+        self.log_file = None
+        self.lines = None
+        self.requests = 0
+
+    def start(self):
+        classpath = os.pathsep.join([compile_server(self.jar, self.javac), self.jar])
+        self.log_file = open(self.log_path, "a")
+        self.process = subprocess.Popen([self.java] + self.jvm_options + ["-cp", classpath, "DesigniteServer"],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self.log_file,
+                                        text=True, encoding="utf-8", bufsize=1)
+        # Answers are read on a thread so a hung analysis can be timed out
+        self.lines = queue.Queue()
+        threading.Thread(target=self._read_answers, args=(self.process.stdout, self.lines), daemon=True).start()
+        self.requests = 0
+        if self._answer(STARTUP_TIMEOUT) != "READY":
+            self.stop()
+            raise RuntimeError(f"Designite server did not start; see {self.log_path}")
+
+    @staticmethod
+    def _read_answers(stdout, lines):
+        for line in stdout:
+            lines.put(line.rstrip("\n"))
+        lines.put(None)
+
+    def _answer(self, timeout):
+        try:
+            return self.lines.get(timeout=timeout)
+        except queue.Empty:
+            return ""
+
+    def stop(self):
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.log_file.close()
+        self.process = None
+
+    # Returns (ok, message, timed_out)
+    def analyse(self, input_folder, output_folder, timeout=None):
+        if self.process is None or self.process.poll() is not None or self.requests >= self.max_requests:
+            self.close()
+            self.start()
+
+        self.requests += 1
+        self.process.stdin.write(f"{os.path.abspath(input_folder)}\t{os.path.abspath(output_folder)}\n")
+        self.process.stdin.flush()
+        answer = self._answer(timeout)
+        if answer == "":
+            self.stop()
+            return False, f"No answer within {timeout}s", True
+        if answer is None:
+            exit_code = self.process.wait()
+            self.stop()
+            return False, f"Designite server exited with code {exit_code}", False
+
+        status, _, message = answer.split("\t", 2)
+        return status == "OK", message, False
+
+    # Let the server finish on end of input instead of killing it
+    def close(self):
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                pass
+        self.stop()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DesigniteServerPool:
+    # One DesigniteServer per worker thread; run_job() has the same result format as
+    # run_designite.run_job so both can back run_designite.run_jobs()
+
+    def __init__(self, jar, java="java", javac="javac", jvm_options=(), log_dir="designite_logs"):
+        self.options = dict(jar=jar, java=java, javac=javac, jvm_options=jvm_options)
+        self.log_dir = log_dir
+        self.local = threading.local()
+        self.servers = []
+        self.lock = threading.Lock()
+        os.makedirs(log_dir, exist_ok=True)
+        compile_server(jar, javac)  # once, before the worker threads race to do it
+
+    def server(self):
+        server = getattr(self.local, "server", None)
+        if server is None:
+            with self.lock:
+                log_path = os.path.join(self.log_dir, f"server{len(self.servers)}.log")
+                server = DesigniteServer(log_path=log_path, **self.options)
+                self.servers.append(server)
+            self.local.server = server
+        return server
+
+    def run_job(self, job, timeout, retries):
+        server = self.server()
+        os.makedirs(job["output"], exist_ok=True)
+        result = dict(job, attempts=0, exit_code=None, timed_out=False, wall_seconds=0.0, log=server.log_path)
+        while result["attempts"] <= retries:
+            result["attempts"] += 1
+            start_time = time.time()
+            try:
+                ok, message, timed_out = server.analyse(job["input"], job["output"], timeout)
+            except (OSError, RuntimeError, subprocess.CalledProcessError) as e:
+                ok, message, timed_out = False, str(e), False
+            result["wall_seconds"] = time.time() - start_time
+            result["timed_out"] = timed_out
+            result["exit_code"] = 0 if ok else None
+            if ok:
+                result.pop("error", None)
+                break
+            result["error"] = message
+
+        result["status"] = "ok" if result["exit_code"] == 0 else "failed"
+        return result
+
+    def close(self):
+        for server in self.servers:
+            server.close()
@@ -0,0 +1,124 @@
+import java.io.BufferedReader;
+import java.io.File;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.nio.charset.StandardCharsets;
+import java.security.Permission;
+
+// Long-lived wrapper around DesigniteJava so the JVM starts and loads its classes once.
+// Reads "<input folder>\t<output folder>" lines from stdin, runs Designite.Designite.main on each
+// and answers every request with one line on stdout:
+//   OK\t<output folder>\t<milliseconds>
+//   ERROR\t<output folder>\t<message>
+// Designite's own console output is sent to stderr so it cannot interleave with the answers.
+//
+// State kept between requests: the only mutable static field in the Designite classes is
+// Designite.utils.Logger.logFile, and Designite.main assigns it on every call. Designite calls
+// System.exit in Designite.parseArguments (status 1-3) and SM_Project.checkNotNull (status 1, no
+// source files). Where the JVM still allows a SecurityManager (Java 17 and older), those calls are
+// trapped and answered as ERROR; otherwise the JVM ends and the client restarts it.
+public class DesigniteServer {
+
+    private static final ExitTrap exitTrap = installExitTrap();
+
+    public static void main(String[] args) throws Exception {
+        PrintStream protocol = new PrintStream(new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+        System.setOut(System.err);
+
+        BufferedReader requests = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        protocol.println("READY");
+        String line;
+        while ((line = requests.readLine()) != null) {
+            if (line.isEmpty()) {
+                continue;
+            }
+            String[] paths = line.split("\t", 2);
+            if (paths.length != 2) {
+                protocol.println("ERROR\t\tExpected <input folder>\\t<output folder>");
+                continue;
+            }
+            protocol.println(analyse(paths[0], paths[1]));
+        }
+        // Threads Designite may have left behind must not keep the JVM alive
+        if (exitTrap != null) {
+            exitTrap.trapping = false;
+        }
+        System.exit(0);
+    }
+
+    private static String analyse(String inputFolder, String outputFolder) {
+        // Designite calls System.exit when a folder has no Java sources, which would end the server
+        if (!containsJavaSource(new File(inputFolder))) {
+            return "ERROR\t" + outputFolder + "\tNo Java source files in " + inputFolder;
+        }
+        long start = System.nanoTime();
+        if (exitTrap != null) {
+            exitTrap.exitStatus = null;
+            exitTrap.trapping = true;
+        }
+        try {
+            Designite.Designite.main(new String[]{"-i", inputFolder, "-o", outputFolder});
+        } catch (Throwable e) {
+            return "ERROR\t" + outputFolder + "\t" + String.valueOf(e).replace('\t', ' ').replace('\n', ' ');
+        } finally {
+            if (exitTrap != null) {
+                exitTrap.trapping = false;
+            }
+        }
+        // Designite may catch the trap's exception itself; the exit it asked for still fails the request
+        if (exitTrap != null && exitTrap.exitStatus != null) {
+            return "ERROR\t" + outputFolder + "\tDesignite called System.exit(" + exitTrap.exitStatus + ")";
+        }
+        return "OK\t" + outputFolder + "\t" + (System.nanoTime() - start) / 1000000;
+    }
+
+    @SuppressWarnings("removal")
+    private static ExitTrap installExitTrap() {
+        ExitTrap trap = new ExitTrap();
+        try {
+            System.setSecurityManager(trap);
+            return trap;
+        } catch (UnsupportedOperationException | SecurityException e) {
+            System.err.println("System.exit cannot be trapped on this JVM: " + e);
+            return null;
+        }
+    }
+
+    // Turns System.exit during an analysis into an exception and allows everything else
+    @SuppressWarnings("removal")
+    private static final class ExitTrap extends SecurityManager {
+        volatile boolean trapping;
+        volatile Integer exitStatus;
+
+        @Override
+        public void checkExit(int status) {
+            if (trapping) {
+                exitStatus = status;
+                throw new SecurityException("Designite called System.exit(" + status + ")");
+            }
+        }
+
+        @Override
+        public void checkPermission(Permission permission) {
+        }
+
+        @Override
+        public void checkPermission(Permission permission, Object context) {
+        }
+    }
+
+    private static boolean containsJavaSource(File folder) {
+        File[] children = folder.listFiles();
+        if (children == null) {
+            return false;
+        }
+        for (File child : children) {
+            if (child.isDirectory() ? containsJavaSource(child) : child.getName().endsWith(".java")) {
+                return true;
+            }
+        }
+        return false;
+    }
+}
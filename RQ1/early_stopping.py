@@ -0,0 +1,56 @@
+# Headers of the prompt templates; the model starting another one means the refactored code is over
+TEMPLATE_MARKERS = ["# unrefactored code", "# refactored version", "# Suggested refactoring types", "<<SYS>>"]
+
+
+# Cut a response at the first template header that follows some actual content
+def truncate_at_markers(response, markers=TEMPLATE_MARKERS):
+    content_start = len(response) - len(response.lstrip())
+    cut = len(response)
+    for marker in markers:
+        position = response.find(marker, content_start + 1)
+        if position != -1:
+            cut = min(cut, position)
+    return response[:cut]
+
+
+# Number of times the brace depth of the code returns to zero, i.e. the number of complete
+# top-level members/types. None when the code is not brace-balanced (e.g. a diff fragment),
+# in which case brace-based stopping is not used for that sample.
+def count_top_level_blocks(code):
+    depth = 0
+    blocks = 0
+    for char in code:
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth < 0:
+                return None
+            if depth == 0:
+                blocks += 1
+    if depth != 0 or blocks == 0:
+        return None
+    return blocks
+
+
+class EarlyStopping:
+    # Configuration of the early-stopping criteria; build() creates fresh criteria for one generate() call
+
+    def __init__(self, time_budget=None, markers=TEMPLATE_MARKERS):
+        self.time_budget = time_budget
+        self.markers = markers
+
+    def params(self):
+        return {"early_stopping": True, "time_budget": self.time_budget, "markers": self.markers}
+
+    # Only the in-process backend builds criteria, so torch is imported here rather than above
+    def build(self, tokenizer, prompt_length, source_codes):
+        from stopping import GeneratedText, TemplateMarkerCriteria, BraceBalanceCriteria, TimeBudgetCriteria, StopMonitor
+        generated_text = GeneratedText(tokenizer, prompt_length, len(source_codes))
+        criteria = [
+            TemplateMarkerCriteria(generated_text, self.markers),
+            BraceBalanceCriteria(generated_text, [count_top_level_blocks(code or "") for code in source_codes])
+        ]
+        if self.time_budget:
+            criteria.append(TimeBudgetCriteria(generated_text, self.time_budget))
+        return StopMonitor(criteria)
@@ -2,9 +2,16 @@
 import json
 import os
 import argparse
+import time
+from dataset_index import iter_records
+from dataset_columnar import columnar_edition, column_names, iter_file_rows
 
-def load_original_files(input_file_path):
-    original_files = set()
+# Sides that only exist in the results file; every other side is read from the dataset
+RESULT_KEYS = ["generated_response"]
+
+# Hash index of the results file: (project, commit_sha, file_name) -> {result key: value}
+def load_results_index(input_file_path, result_keys=RESULT_KEYS):
+    results_index = {}
     with open(input_file_path, 'r') as file:
         for line in file:
             try:
@@ -13,46 +20,111 @@ def load_original_files(input_file_path):
                 commit_sha = data.get("commit_sha", "")
                 file_name = data.get("file_name", "")
                 if project_name and commit_sha and file_name:
-                    original_files.add((project_name, commit_sha, file_name))
+                    results_index[(project_name, commit_sha, file_name)] = {key: data[key] for key in result_keys if key in data}
             except Exception as e:
-                print(f"An error occurred while loading original files: {e}")
-    return original_files
+                print(f"An error occurred while loading the results file: {e}")
+    return results_index
 
-def process_jsonl(input_file_path, original_file_set, refactoring_key, output_dir):
-    with open(input_file_path, 'r') as file:
-        for line in file:
-            try:
-                data = json.loads(line)
-                project_name = data.get("project", "default_project_name")
-                commit_sha = data.get("commit_sha", "default_commit_sha")
-                files = data.get("files", [])
-
-                for file_data in files:
-                    file_name = file_data.get("file_name", "default_name.java")
-                    file_key = (project_name, commit_sha, file_name)
-                    if file_key not in original_file_set:
-                        continue  # Skip saving if the file is not in the original dataset
-
-                    after_refactoring = file_data.get(f"{refactoring_key}", "")
-                    
-                    # Extract directory path from the file name
-                    dir_structure = os.path.dirname(file_name)
-                    
-                    # Use the extracted project name and commit_sha in the directory path
-                    after_dir_path = os.path.join(f"{output_dir}", project_name, commit_sha)
-                    
-                    # Ensure all intermediate directories are created
-                    os.makedirs(after_dir_path, exist_ok=True)
-
-                    # Final output file path
-                    after_output_file_path = os.path.join(after_dir_path, os.path.basename(file_name))
-
-                    # Write the after_refactoring content
-                    with open(after_output_file_path, 'w') as after_file:
-                        after_file.write(preprocess_generated_response(after_refactoring))
+# Dataset/results key -> output tree written by the single-pass extraction
+TREES = {
+    "before_refactoring": "before_refactoring",
+    "after_refactoring": "developer_refactoring",
+    "generated_response": "llm_refactoring"
+}
 
-            except Exception as e:
-                print(f"An error occurred: {e}")
+def iter_dataset_commits(input_file_path, refactoring_keys):
+    parquet_path = columnar_edition(input_file_path)
+    if parquet_path is None:
+        yield from iter_records(input_file_path)
+        return
+
+    # Regroup the per-file rows into commits, reading only the key columns and the requested sides
+    columns = ["line_number", "project", "commit_sha", "file_name"]
+    available = column_names(parquet_path)
+    columns += [key for key in refactoring_keys if key in available]
+    current_line, data = None, None
+    for row in iter_file_rows(parquet_path, columns):
+        if row["line_number"] != current_line:
+            if data is not None:
+                yield data
+            current_line = row["line_number"]
+            data = {"project": row["project"], "commit_sha": row["commit_sha"], "files": []}
+        if row["file_name"] is not None:
+            data["files"].append({key: row[key] for key in columns[3:]})
+    if data is not None:
+        yield data
+
+# Join the dataset with the results index. Yields (project, commit_sha, file_name, sides) for every
+# dataset file that has a result, where sides maps each requested key to its text, taken from the
+# results file for RESULT_KEYS and from the dataset otherwise.
+def iter_joined_files(dataset_path, results_index, refactoring_keys):
+    dataset_keys = [key for key in refactoring_keys if key not in RESULT_KEYS]
+    for data in iter_dataset_commits(dataset_path, dataset_keys):
+        project_name = data.get("project", "default_project_name")
+        commit_sha = data.get("commit_sha", "default_commit_sha")
+
+        for file_data in data.get("files", []):
+            file_name = file_data.get("file_name", "default_name.java")
+            file_key = (project_name, commit_sha, file_name)
+            result = results_index.get(file_key)
+            if result is None:
+                continue  # Skip saving if the file is not in the results
+
+            sides = {}
+            for key in refactoring_keys:
+                source = result if key in RESULT_KEYS else file_data
+                sides[key] = source.get(key, "")
+            yield project_name, commit_sha, file_name, sides
+
+def process_jsonl(dataset_path, results_index, refactoring_key, output_dir):
+    for project_name, commit_sha, file_name, sides in iter_joined_files(dataset_path, results_index, [refactoring_key]):
+        try:
+            # Use the extracted project name and commit_sha in the directory path
+            after_dir_path = os.path.join(f"{output_dir}", project_name, commit_sha)
+
+            # Ensure all intermediate directories are created
+            os.makedirs(after_dir_path, exist_ok=True)
+
+            # Final output file path
+            after_output_file_path = os.path.join(after_dir_path, os.path.basename(file_name))
+
+            # Write the refactored content
+            with open(after_output_file_path, 'w') as after_file:
+                after_file.write(preprocess_generated_response(sides[refactoring_key]))
+
+        except Exception as e:
+            print(f"An error occurred: {e}")
+
+class TreeWriter:
+    # Writes extracted files, creating each directory only once
+
+    def __init__(self):
+        self.created_dirs = set()
+        self.files_written = 0
+
+    def write(self, dir_path, file_name, content):
+        if dir_path not in self.created_dirs:
+            os.makedirs(dir_path, exist_ok=True)
+            self.created_dirs.add(dir_path)
+        try:
+            with open(os.path.join(dir_path, file_name), 'w') as output_file:
+                output_file.write(content)
+            self.files_written += 1
+        except Exception as e:
+            print(f"An error occurred: {os.path.join(dir_path, file_name)}: {e}")
+
+# Stream the dataset once and write the before, developer and LLM trees together
+def extract_all_trees(input_file_path, dataset_path, output_base_dir="."):
+    start_time = time.time()
+    results_index = load_results_index(input_file_path)
+    writer = TreeWriter()
+
+    for project_name, commit_sha, file_name, sides in iter_joined_files(dataset_path, results_index, list(TREES)):
+        for refactoring_key, tree in TREES.items():
+            writer.write(os.path.join(output_base_dir, tree, project_name, commit_sha),
+                         os.path.basename(file_name), preprocess_generated_response(sides[refactoring_key]))
+
+    print(f"Wrote {writer.files_written} files to {len(TREES)} trees in {time.time() - start_time:.1f} seconds")
 
 def preprocess_generated_response(response_text):
     marker = "sion of the same code:"
@@ -67,12 +139,21 @@ def preprocess_generated_response(response_text):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Process JSONL files with command line arguments.")
     parser.add_argument("input_file_path", help="Path to the StarCoder2 generated refactorings JSONL file")
-    parser.add_argument("refactoring_key", help="Key to retrieve the 'after_refactoring' data")
-    parser.add_argument("output_dir", help="Base directory for storing processed files")
+    parser.add_argument("refactoring_key", nargs="?", help="Key to retrieve the 'after_refactoring' data")
+    parser.add_argument("output_dir", nargs="?", help="Base directory for storing processed files")
+    parser.add_argument("--all_trees", action="store_true",
+                        help="Write the before_refactoring, developer_refactoring and llm_refactoring trees in one pass")
+    parser.add_argument("--output_base_dir", default=".", help="With --all_trees, directory in which the trees are created")
     args = parser.parse_args()
 
-    # Load the original file names with project and commit_sha from the JSONL
-    original_file_set = load_original_files(args.input_file_path)
+    if args.all_trees:
+        extract_all_trees(args.input_file_path, 'sampled_dataset.jsonl', args.output_base_dir)
+        raise SystemExit(0)
+    if not args.refactoring_key or not args.output_dir:
+        parser.error("refactoring_key and output_dir are required unless --all_trees is given")
+
+    # Index the results by project, commit_sha and file name
+    results_index = load_results_index(args.input_file_path)
 
-    # Process the JSONL with the original file set
-    process_jsonl('sampled_dataset.jsonl', original_file_set, args.refactoring_key, args.output_dir)
\ No newline at end of file
+    # Join the dataset with the results and write the requested side
+    process_jsonl('sampled_dataset.jsonl', results_index, args.refactoring_key, args.output_dir)
\ No newline at end of file
@@ -0,0 +1,77 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+
+def generation_key(model_id, prompt, decoding_params):
+    payload = json.dumps({"model_id": model_id, "prompt": prompt, "params": decoding_params}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    # On-disk cache of raw model responses keyed by generation_key(). Responses are stored
+    # before post-processing, so changing clean-up code does not require regenerating.
+
+    def __init__(self, db_path):
+        # WAL lets several inference processes share one cache file
+        self.connection = sqlite3.connect(db_path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS generations ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, generation_time REAL, created REAL)")
+        self.connection.commit()
+
+    def get(self, key):
+        row = self.connection.execute(
+            "SELECT response, generation_time FROM generations WHERE key = ?", (key,)).fetchone()
+        return row
+
+    def put(self, key, response, generation_time):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO generations (key, response, generation_time, created) VALUES (?, ?, ?, ?)",
+            (key, response, generation_time, time.time()))
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+class CachedGeneration:
+    # Sits between the work-item stream and a generation loop. filter() answers cache hits
+    # directly and holds back repeats of a prompt that is still being generated; complete()
+    # stores a fresh response and returns the held-back items that share it.
+
+    def __init__(self, cache, model_id, decoding_params):
+        self.cache = cache
+        self.model_id = model_id
+        self.decoding_params = decoding_params
+        self.waiting = {}
+        self.hits = 0
+
+    def filter(self, items, on_result):
+        for item in items:
+            key = generation_key(self.model_id, item["prompt"], self.decoding_params)
+            item["cache_key"] = key
+            if key in self.waiting:
+                self.waiting[key].append(item)
+                continue
+
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.hits += 1
+                on_result(item, *cached)
+                continue
+
+            self.waiting[key] = []
+            yield item
+
+    def complete(self, item, response, generation_time):
+        self.cache.put(item["cache_key"], response, generation_time)
+        duplicates = self.waiting.pop(item["cache_key"], [])
+        self.hits += len(duplicates)
+        return duplicates
+
+    # The prompt could not be generated: release its held-back repeats so they can be reported too
+    def fail(self, item):
+        return self.waiting.pop(item["cache_key"], [])
@@ -1,87 +1,181 @@
-import torch
 import json
 import os
-import time
-from transformers import AutoTokenizer, AutoModelForCausalLM
 import argparse
+from dataset_index import JsonlReader
+from resume import load_completed_keys
+from backends import HFBackend, CompletionServerBackend, run_async
+from generation_cache import GenerationCache, CachedGeneration
+from early_stopping import EarlyStopping
+
+MODEL_ID = "bigcode/starcoder2-15b"
+MAX_NEW_TOKENS = 600
+DECODING_PARAMS = {"max_new_tokens": MAX_NEW_TOKENS, "do_sample": False}
+
+DEFAULT_SYSTEM_PROMPT = """You are a powerful model specialized in refactoring Java code. Code refactoring is
+    the process of improving the internal structure, readability, and maintainability of a software codebase without 
+    altering its external behavior or functionality. You must output a refactored version of the code."""
+
+SYSTEM_PROMPT = DEFAULT_SYSTEM_PROMPT
+B_SYS, E_SYS = "<<SYS>>\n", "\n<</SYS>>\n\n"
+
+def build_pre_prompt(before_code):
+    # Construct the prompt with the before code
+    return f"""# unrefactored code:
+{before_code}
+        
+# refactored version of the same code:
+        """
+
+def iter_commit_items(data, completed_keys):
+    project = data.get('project', '')
+    commit_sha = data.get('commit_sha', '')
+    files = data.get('files', [])
+
+    for file_info in files:
+        file_name = file_info.get('file_name', '')
+        before_code = file_info.get('before_refactoring', '')
+
+        if (project, commit_sha, file_name) in completed_keys:
+            continue
+
+        pre_prompt = build_pre_prompt(before_code)
+        yield {
+            "project": project,
+            "commit_sha": commit_sha,
+            "file_name": file_name,
+            "before_code": before_code,
+            "pre_prompt": pre_prompt,
+            "prompt": f"{B_SYS}{SYSTEM_PROMPT}{E_SYS}{pre_prompt}"
+        }
+
+def iter_work_items(test_file, start_line, completed_keys):
+    for i, data in test_file.iter_from(start_line):
+        yield from iter_commit_items(data, completed_keys)
+
+def clean_response(response, pre_prompt):
+    # Ensure the response does not include the prompt or repetition
+    return response.strip().replace(pre_prompt.strip(), "").strip()
+
+def write_result(results_file, item, response, generation_time, telemetry=None):
+    results = {
+        "project": item["project"],
+        "commit_sha": item["commit_sha"],
+        "file_name": item["file_name"],
+        "input": item["before_code"],
+        "generated_response": response,
+        "generation_time": generation_time
+    }
+    if telemetry is not None:
+        results["telemetry"] = telemetry
+    results_file.write(json.dumps(results) + "\n")
+    results_file.flush()
+    print(f"Result for file {item['file_name']} saved.")
+
+def generate_one(backend, item, on_result):
+    print(f"Prompt for file {item['file_name']} in commit {item['commit_sha']}:\n{item['prompt']}\n")
+
+    print("Generating output")
+    response, generation_time, telemetry = backend.generate(item["prompt"], MAX_NEW_TOKENS, item["before_code"])
+    print(f"Generation time: {generation_time} seconds")
+
+    on_result(item, response, generation_time, telemetry)
+
+def generate_batched(backend, items, on_result, batch_size):
+    # Imported here so --backend openai runs without torch and transformers installed
+    from batching import iter_length_buckets
+    for batch in iter_length_buckets(items, backend.tokenizer, batch_size):
+        responses, generation_time, generated_tokens, telemetries = backend.generate_batch(
+            [item["prompt"] for item in batch], MAX_NEW_TOKENS, [item["before_code"] for item in batch])
+        print(f"Batch of {len(batch)}: {generated_tokens} tokens in {generation_time:.2f} seconds "
+              f"({generated_tokens / max(generation_time, 1e-9):.1f} tokens/s)")
+
+        # Every record of the batch carries the wall-clock time of the whole batch
+        for item, response, telemetry in zip(batch, responses, telemetries):
+            on_result(item, response, generation_time, telemetry)
 
 def main():
     parser = argparse.ArgumentParser(description='Run Starcoder refactoring.')
-    parser.add_argument('--device', type=str, required=True, help='Device to use, e.g., "cuda:0"')
-    parser.add_argument('--start_line', type=int, required=True, help='Line number to start processing from')
+    parser.add_argument('--device', type=str, default='cpu', help='Device to use, e.g., "cuda:0"')
+    parser.add_argument('--start_line', type=int, default=0, help='Line number to start processing from')
     parser.add_argument('--output_file', type=str, required=True, help='Path to the output file')
+    parser.add_argument('--resume', action='store_true', help='Skip files whose results are already in the output file')
+    parser.add_argument('--batch_size', type=int, default=1, help='Number of prompts generated together; prompts are bucketed by token length')
+    parser.add_argument('--prefix_cache', action='store_true', help='Prefill the shared system prompt once and reuse its KV cache for every prompt')
+    parser.add_argument('--model_id', type=str, default=MODEL_ID, help='Hugging Face model to load, e.g. a small causal LM for CPU runs')
+    parser.add_argument('--early_stopping', action='store_true',
+                        help='Stop generating when a prompt header reappears or the code\'s braces close as often as in the input')
+    parser.add_argument('--time_budget', type=float, default=None, help='With --early_stopping, maximum seconds of generation per sample')
+    parser.add_argument('--backend', type=str, default='hf', choices=['hf', 'openai'],
+                        help='Generate in-process with Hugging Face or through an OpenAI-compatible completion server')
+    parser.add_argument('--api_base', type=str, default='http://127.0.0.1:8000', help='Base URL of the completion server')
+    parser.add_argument('--generation_cache', type=str, default=None,
+                        help='SQLite file caching responses by model, prompt and decoding settings; repeated prompts are served from it')
+    parser.add_argument('--concurrency', type=int, default=16, help='Maximum concurrent requests to the completion server')
 
     args = parser.parse_args()
+    if args.prefix_cache and args.batch_size > 1:
+        parser.error('--prefix_cache is only supported with --batch_size 1')
+    if args.backend == 'openai' and (args.prefix_cache or args.batch_size > 1):
+        parser.error('--prefix_cache and --batch_size only apply to the hf backend')
 
-    model_id = "bigcode/starcoder2-15b"
+    model_id = args.model_id
     device = args.device
     start_line = args.start_line
     output_file_path = args.output_file
 
-    DEFAULT_SYSTEM_PROMPT = """You are a powerful model specialized in refactoring Java code. Code refactoring is
-    the process of improving the internal structure, readability, and maintainability of a software codebase without 
-    altering its external behavior or functionality. You must output a refactored version of the code."""
-
-    SYSTEM_PROMPT = DEFAULT_SYSTEM_PROMPT
-    B_SYS, E_SYS = "<<SYS>>\n", "\n<</SYS>>\n\n"
+    early_stopping = EarlyStopping(args.time_budget) if args.early_stopping else None
+    decoding_params = dict(DECODING_PARAMS, **(early_stopping.params() if early_stopping else {}))
 
-    tokenizer = AutoTokenizer.from_pretrained(model_id)
-    model = AutoModelForCausalLM.from_pretrained(model_id).to(device)
+    if args.backend == 'openai':
+        stop = early_stopping.markers if early_stopping else None
+        backend = CompletionServerBackend(args.api_base, model_id, concurrency=args.concurrency, stop=stop)
+    else:
+        prefix = f"{B_SYS}{SYSTEM_PROMPT}{E_SYS}" if args.prefix_cache else None
+        backend = HFBackend(model_id, device, prefix=prefix, early_stopping=early_stopping)
 
     output_dir = os.path.dirname(output_file_path)
     if output_dir and not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    with open("sampled_dataset.jsonl", "r") as test_file, open(output_file_path, "a") as results_file:
-        lines = test_file.readlines()
-        for i in range(start_line, len(lines)):
-            data = json.loads(lines[i])
-            project = data.get('project', '')
-            commit_sha = data.get('commit_sha', '')
-            files = data.get('files', [])
-
-            for file_info in files:
-                file_name = file_info.get('file_name', '')
-                before_code = file_info.get('before_refactoring', '')
-
-                # Construct the prompt with the before code
-                pre_prompt = f"""# unrefactored code:
-{before_code}
-        
-# refactored version of the same code:
-        """
-
-                prompt = f"{B_SYS}{SYSTEM_PROMPT}{E_SYS}{pre_prompt}"
-                print(f"Prompt for file {file_name} in commit {commit_sha}:\n{prompt}\n")
-
-                tokens = tokenizer.encode(prompt, return_tensors="pt").to(device)
-
-                torch.cuda.empty_cache()
-
-                start_time = time.time()
-                print("Generating output")
-                outputs = model.generate(tokens, max_new_tokens=600, pad_token_id=tokenizer.eos_token_id, eos_token_id=tokenizer.eos_token_id)
-                end_time = time.time()
-                generation_time = end_time - start_time
-                print(f"Generation time: {generation_time} seconds")
-
-                for j in range(len(outputs)):
-                    new_tokens = outputs[j][tokens.shape[-1]:]  # Generated tokens
-                    response = tokenizer.decode(new_tokens, skip_special_tokens=True).strip()
-
-                    # Ensure the response does not include the prompt or repetition
-                    response = response.replace(pre_prompt.strip(), "").strip()
-
-                    results = {
-                        "project": project,
-                        "commit_sha": commit_sha,
-                        "file_name": file_name,
-                        "input": before_code,
-                        "generated_response": response,
-                        "generation_time": generation_time
-                    }
-                    results_file.write(json.dumps(results) + "\n")
-                    print(f"Result for file {file_name} saved.")
+    completed_keys = load_completed_keys(output_file_path) if args.resume else set()
+    if completed_keys:
+        print(f"Resuming: {len(completed_keys)} files already in {output_file_path}")
+
+    cached_generation = None
+    if args.generation_cache:
+        cached_generation = CachedGeneration(GenerationCache(args.generation_cache), model_id, decoding_params)
+
+    with JsonlReader("sampled_dataset.jsonl") as test_file, open(output_file_path, "a") as results_file:
+        def write_response(item, response, generation_time, telemetry=None):
+            write_result(results_file, item, clean_response(response, item["pre_prompt"]), generation_time, telemetry)
+
+        def on_result(item, response, generation_time, telemetry=None):
+            write_response(item, response, generation_time, telemetry)
+            if cached_generation is not None:
+                for duplicate in cached_generation.complete(item, response, generation_time):
+                    write_response(duplicate, response, generation_time)
+
+        items = iter_work_items(test_file, start_line, completed_keys)
+        if cached_generation is not None:
+            items = cached_generation.filter(items, write_response)
+
+        def on_error(item, error):
+            failed = [item] + (cached_generation.fail(item) if cached_generation is not None else [])
+            for failed_item in failed:
+                print(f"Generation failed for file {failed_item['file_name']} in commit {failed_item['commit_sha']}: {error!r}")
+
+        if args.backend == 'openai':
+            failures = run_async(backend, items, MAX_NEW_TOKENS, on_result, on_error)
+            if failures:
+                print(f"{failures} prompts failed and were not written; run again with --resume to retry them")
+        elif args.batch_size > 1:
+            generate_batched(backend, items, on_result, args.batch_size)
+        else:
+            for item in items:
+                generate_one(backend, item, on_result)
+
+    if cached_generation is not None:
+        print(f"Generation cache hits: {cached_generation.hits}")
 
 if __name__ == "__main__":
     main()
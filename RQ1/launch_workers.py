@@ -0,0 +1,186 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import time
+from dataset_index import JsonlReader
+from resume import load_completed_keys, record_key
+from work_queue import WorkQueue
+
+DATASET_PATH = "sampled_dataset.jsonl"
+POLL_SECONDS = 5
+
+
+# Group logical CPUs by physical package so each CPU worker can be pinned to one socket
+def cpu_sockets():
+    sockets = {}
+    for cpu in sorted(os.sched_getaffinity(0)):
+        try:
+            with open(f"/sys/devices/system/cpu/cpu{cpu}/topology/physical_package_id") as file:
+                socket = int(file.read())
+        except (OSError, ValueError):
+            socket = 0
+        sockets.setdefault(socket, []).append(cpu)
+    return list(sockets.values())
+
+
+def shard_path(output_file_path, worker_id):
+    return f"{output_file_path}.worker{worker_id}.jsonl"
+
+
+def worker_main(worker_id, device, cpus, args):
+    # Imported here so the launcher itself does not load torch before spawning workers
+    import torch
+    from backends import HFBackend
+    from generation_cache import GenerationCache, CachedGeneration
+    from inference import B_SYS, E_SYS, SYSTEM_PROMPT, DECODING_PARAMS
+    from inference import iter_commit_items, clean_response, write_result, generate_one
+    from early_stopping import EarlyStopping
+
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+        torch.set_num_threads(len(cpus))
+
+    owner = f"worker{worker_id}-{os.getpid()}"
+    early_stopping = EarlyStopping(args.time_budget) if args.early_stopping else None
+    prefix = f"{B_SYS}{SYSTEM_PROMPT}{E_SYS}" if args.prefix_cache else None
+    backend = HFBackend(args.model_id, device, prefix=prefix, early_stopping=early_stopping)
+
+    cached_generation = None
+    if args.generation_cache:
+        decoding_params = dict(DECODING_PARAMS, **(early_stopping.params() if early_stopping else {}))
+        cached_generation = CachedGeneration(GenerationCache(args.generation_cache), args.model_id, decoding_params)
+
+    # Files already written by any worker (e.g. one that died mid-commit) are not regenerated.
+    # Only this worker's own shard may be truncated; the others can be mid-write.
+    own_shard = shard_path(args.output_file, worker_id)
+    completed_keys = load_completed_keys(own_shard)
+    completed_keys |= load_completed_keys(args.output_file, truncate=False)
+    for path in glob.glob(shard_path(args.output_file, "*")):
+        if os.path.abspath(path) != os.path.abspath(own_shard):
+            completed_keys |= load_completed_keys(path, truncate=False)
+
+    queue = WorkQueue(args.queue_file)
+    with JsonlReader(DATASET_PATH) as test_file, open(own_shard, "a") as results_file:
+        def write_response(item, response, generation_time, telemetry=None):
+            write_result(results_file, item, clean_response(response, item["pre_prompt"]), generation_time, telemetry)
+
+        def on_result(item, response, generation_time, telemetry=None):
+            write_response(item, response, generation_time, telemetry)
+            if cached_generation is not None:
+                for duplicate in cached_generation.complete(item, response, generation_time):
+                    write_response(duplicate, response, generation_time)
+
+        while True:
+            line_number = queue.lease(owner, args.lease_seconds)
+            if line_number is None:
+                if queue.remaining() == 0:
+                    break
+                # Other workers still hold leases that may expire and come back
+                time.sleep(POLL_SECONDS)
+                continue
+
+            items = iter_commit_items(test_file[line_number], completed_keys)
+            if cached_generation is not None:
+                items = cached_generation.filter(items, write_response)
+            for item in items:
+                generate_one(backend, item, on_result)
+                queue.renew(line_number, owner, args.lease_seconds)
+            queue.ack(line_number, owner)
+
+    queue.close()
+
+
+# Append the shard records to the main output, dropping keys that are already there and lines
+# that are not complete records, then remove the shards
+def merge_outputs(output_file_path, shard_paths):
+    seen = load_completed_keys(output_file_path)
+    merged = 0
+    with open(output_file_path, "a") as results_file:
+        for path in shard_paths:
+            with open(path, "r") as shard:
+                for line_number, line in enumerate(shard, 1):
+                    try:
+                        record = json.loads(line) if line.endswith("\n") else None
+                    except json.JSONDecodeError:
+                        record = None
+                    if not isinstance(record, dict):
+                        print(f"Skipping unreadable record on line {line_number} of {path}")
+                        continue
+                    key = record_key(record)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    results_file.write(line)
+                    merged += 1
+    for path in shard_paths:
+        os.remove(path)
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run RQ1 inference with one worker process per device.')
+    parser.add_argument('--devices', type=str, default='cpu',
+                        help='Comma-separated devices, e.g. "cuda:0,cuda:1"; "cpu" starts one worker per CPU socket')
+    parser.add_argument('--num_workers', type=int, default=None, help='Number of CPU workers (defaults to the number of sockets)')
+    parser.add_argument('--output_file', type=str, required=True, help='Path to the merged output file')
+    parser.add_argument('--queue_file', type=str, default=None, help='SQLite work queue (defaults to <output_file>.queue.sqlite)')
+    parser.add_argument('--start_line', type=int, default=0, help='First dataset line to enqueue')
+    parser.add_argument('--end_line', type=int, default=None, help='Dataset line to stop before')
+    parser.add_argument('--lease_seconds', type=float, default=1800, help='How long a worker may hold a commit without progress')
+    parser.add_argument('--model_id', type=str, default='bigcode/starcoder2-15b', help='Model to load in every worker')
+    parser.add_argument('--prefix_cache', action='store_true', help='Reuse the KV cache of the shared system prompt')
+    parser.add_argument('--early_stopping', action='store_true', help='Enable the early-stopping criteria')
+    parser.add_argument('--time_budget', type=float, default=None, help='With --early_stopping, maximum seconds per sample')
+    parser.add_argument('--generation_cache', type=str, default=None, help='SQLite generation cache shared by the workers')
+    args = parser.parse_args()
+    args.queue_file = args.queue_file or f"{args.output_file}.queue.sqlite"
+
+    output_dir = os.path.dirname(args.output_file)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    if args.devices == 'cpu':
+        sockets = cpu_sockets()
+        num_workers = args.num_workers or len(sockets)
+        # Workers share sockets round-robin when there are more workers than sockets
+        workers = [('cpu', sockets[i % len(sockets)]) for i in range(num_workers)]
+    else:
+        workers = [(device, None) for device in args.devices.split(',')]
+
+    queue = WorkQueue(args.queue_file)
+    with JsonlReader(DATASET_PATH) as test_file:
+        end_line = len(test_file) if args.end_line is None else min(args.end_line, len(test_file))
+    queue.populate(range(args.start_line, end_line))
+    print(f"{queue.remaining()} commits left in {args.queue_file}, starting {len(workers)} workers")
+
+    context = multiprocessing.get_context('spawn')
+    processes = {}
+    for worker_id, (device, cpus) in enumerate(workers):
+        process = context.Process(target=worker_main, args=(worker_id, device, cpus, args))
+        process.start()
+        processes[worker_id] = process
+
+    while processes:
+        time.sleep(POLL_SECONDS)
+        for worker_id, process in list(processes.items()):
+            if process.is_alive():
+                continue
+            del processes[worker_id]
+            if process.exitcode != 0:
+                released = queue.release(f"worker{worker_id}-{process.pid}")
+                print(f"Worker {worker_id} exited with code {process.exitcode}; re-queued {released} commits")
+
+    remaining = queue.remaining()
+    queue.close()
+
+    shard_paths = sorted(glob.glob(shard_path(args.output_file, "*")))
+    merged = merge_outputs(args.output_file, shard_paths)
+    print(f"Merged {merged} records into {args.output_file}")
+    if remaining:
+        print(f"{remaining} commits were not completed; rerun the same command to finish them")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import copy
+import torch
+
+# Continuations used to find where the tokenization of the prefix stops depending on what follows it
+PROBE_SUFFIXES = ["#", "a", " ", "\n", "{"]
+
+
+def _common_prefix_length(sequences):
+    length = min(len(sequence) for sequence in sequences)
+    for position in range(length):
+        if len({sequence[position] for sequence in sequences}) > 1:
+            return position
+    return length
+
+
+class PrefixCache:
+    # Holds the past_key_values of the constant system-prompt block so that only the
+    # variable part of each prompt is prefilled. The full prompt is still tokenized as
+    # before, so the model sees exactly the same input ids with or without the cache.
+
+    def __init__(self, model, tokenizer, prefix, device):
+        self.model = model
+        self.device = device
+
+        # Tokens at the end of the prefix can merge with the start of the suffix (e.g. "\n\n#"),
+        # so only the part that tokenizes the same whatever follows is cached
+        tokenized = [tokenizer.encode(prefix + probe) for probe in PROBE_SUFFIXES]
+        tokenized.append(tokenizer.encode(prefix))
+        self.prefix_ids = tokenized[0][:_common_prefix_length(tokenized)]
+
+        prefix_tensor = torch.tensor([self.prefix_ids], device=device)
+        with torch.no_grad():
+            self.past_key_values = model(prefix_tensor, use_cache=True).past_key_values
+
+    def matches(self, input_ids):
+        length = len(self.prefix_ids)
+        return input_ids.shape[-1] > length and input_ids[0, :length].tolist() == self.prefix_ids
+
+    def generate(self, input_ids, **generate_kwargs):
+        if input_ids.shape[0] != 1 or not self.matches(input_ids):
+            return self.model.generate(input_ids, **generate_kwargs)
+
+        # generate() extends the cache in place, so every prompt starts from a fresh copy
+        cache = copy.deepcopy(self.past_key_values)
+        attention_mask = torch.ones_like(input_ids)
+        return self.model.generate(input_ids, attention_mask=attention_mask, past_key_values=cache, **generate_kwargs)
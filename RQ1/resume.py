@@ -0,0 +1,38 @@
+import json
+import os
+
+
+def record_key(record):
+    return (record.get('project', ''), record.get('commit_sha', ''), record.get('file_name', ''))
+
+
+# Collect the (project, commit_sha, file_name) keys already present in a results file.
+# A job killed mid-write can leave a truncated last line; it is cut off here so the
+# record is regenerated instead of leaving a broken line in the middle of the output.
+# Pass truncate=False for a file another live process may still be appending to: its
+# unfinished last line is then only left out of the keys.
+def load_completed_keys(output_file_path, truncate=True):
+    completed = set()
+    if not os.path.exists(output_file_path):
+        return completed
+
+    position = 0
+    valid_end = 0
+    with open(output_file_path, 'rb') as results_file:
+        for line in results_file:
+            position += len(line)
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping unreadable record ending at byte {position} of {output_file_path}")
+                continue
+            if line.endswith(b"\n"):
+                completed.add(record_key(record))
+                valid_end = position
+
+    if truncate and valid_end != position:
+        print(f"Truncating incomplete record at byte {valid_end} of {output_file_path}")
+        with open(output_file_path, 'r+b') as results_file:
+            results_file.truncate(valid_end)
+
+    return completed
@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+DESIGNITE_JAR_PATH = "./DesigniteJava.jar"
+CODE_SMELL_DIRECTORY = "code_smells"
+TREES = ["before_refactoring", "developer_refactoring", "llm_refactoring"]
+
+
+# MemAvailable from /proc/meminfo in MB, or None where it cannot be read
+def available_memory_mb():
+    try:
+        with open("/proc/meminfo") as file:
+            for line in file:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+
+# As many JVMs as there are cores, but no more than fit in the available memory
+def default_workers(memory_per_job_mb):
+    cores = len(os.sched_getaffinity(0))
+    memory_mb = available_memory_mb()
+    if memory_mb is None:
+        return cores
+    return max(1, min(cores, memory_mb // memory_per_job_mb))
+
+
+def directory_size(path):
+    size = 0
+    for root, _, files in os.walk(path):
+        for file_name in files:
+            try:
+                size += os.path.getsize(os.path.join(root, file_name))
+            except OSError:
+                pass
+    return size
+
+
+# One job per project folder of every tree; output goes to code_smells/<tree>/<project>_smells,
+# the layout count_smell_types.py reads
+def collect_jobs(trees, output_dir):
+    jobs = []
+    for tree_dir in trees:
+        if not os.path.isdir(tree_dir):
+            print(f"Tree not found: {tree_dir}")
+            continue
+        tree = os.path.basename(os.path.normpath(tree_dir))
+        for project_name in sorted(os.listdir(tree_dir)):
+            project_folder = os.path.join(tree_dir, project_name)
+            if os.path.isdir(project_folder):
+                jobs.append({
+                    "tree": tree,
+                    "project": project_name,
+                    "input": project_folder,
+                    "output": os.path.join(output_dir, tree, f"{project_name}_smells"),
+                    "input_bytes": directory_size(project_folder)
+                })
+    # Largest projects first so a long analysis does not start last and leave the other workers idle
+    jobs.sort(key=lambda job: job["input_bytes"], reverse=True)
+    return jobs
+
+
+def run_job(job, command, timeout, retries, log_dir):
+    log_path = os.path.join(log_dir, job["tree"], f"{job['project']}.log")
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    os.makedirs(job["output"], exist_ok=True)
+
+    result = dict(job, attempts=0, exit_code=None, timed_out=False, wall_seconds=0.0, log=log_path)
+    with open(log_path, "w") as log_file:
+        while result["attempts"] <= retries:
+            result["attempts"] += 1
+            start_time = time.time()
+            try:
+                completed = subprocess.run(command + ["-i", job["input"], "-o", job["output"]],
+                                           stdout=log_file, stderr=subprocess.STDOUT, timeout=timeout)
+                result["exit_code"] = completed.returncode
+                result["timed_out"] = False
+            except subprocess.TimeoutExpired:
+                result["exit_code"] = None
+                result["timed_out"] = True
+            result["wall_seconds"] = time.time() - start_time
+            if result["exit_code"] == 0:
+                break
+            log_file.write(f"\nAttempt {result['attempts']} failed (exit code {result['exit_code']}, timed out: {result['timed_out']})\n")
+            log_file.flush()
+
+    result["status"] = "ok" if result["exit_code"] == 0 else "failed"
+    return result
+
+
+def jvm_options(memory_per_job_mb, workers):
+    # Keep every JVM from sizing its GC and compiler thread pools for the whole machine
+    active_processors = max(1, len(os.sched_getaffinity(0)) // workers)
+    return [f"-Xmx{memory_per_job_mb}m", f"-XX:ActiveProcessorCount={active_processors}"]
+
+
+def designite_command(java, jar, memory_per_job_mb, workers):
+    return [java] + jvm_options(memory_per_job_mb, workers) + ["-jar", jar]
+
+
+# Run the jobs on the pool, either one JVM per job or, with --server, on long-lived
+# Designite servers (designite_client.py), one per worker
+def run_jobs(jobs, args, workers):
+    if args.server:
+        from designite_client import DesigniteServerPool
+        pool = DesigniteServerPool(args.jar, args.java, args.javac, jvm_options(args.memory_per_job_mb, workers), args.log_dir)
+        run = lambda job: pool.run_job(job, args.timeout, args.retries)
+    else:
+        command = designite_command(args.java, args.jar, args.memory_per_job_mb, workers)
+        run = lambda job: run_job(job, command, args.timeout, args.retries, args.log_dir)
+
+    results = []
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(run, job) for job in jobs]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                print(f"[{len(results)}/{len(jobs)}] {result['tree']}/{result['project']}: {result['status']} "
+                      f"in {result['wall_seconds']:.1f}s after {result['attempts']} attempt(s)")
+    finally:
+        if args.server:
+            pool.close()
+    return results
+
+
+# Options shared by the scripts that run Designite through run_jobs()
+def add_runner_arguments(parser):
+    parser.add_argument("--jar", default=DESIGNITE_JAR_PATH, help="Path to DesigniteJava.jar")
+    parser.add_argument("--java", default="java", help="Java executable")
+    parser.add_argument("--javac", default="javac", help="Java compiler, used with --server")
+    parser.add_argument("--server", action="store_true",
+                        help="Experimental: reuse one Designite JVM per worker instead of starting a JVM per job")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Concurrent JVMs (defaults to the cores, capped by MemAvailable / --memory_per_job_mb)")
+    parser.add_argument("--memory_per_job_mb", type=int, default=2048, help="Heap given to each JVM")
+    parser.add_argument("--timeout", type=float, default=3600, help="Seconds before a Designite run is killed")
+    parser.add_argument("--retries", type=int, default=1, help="Extra attempts for a failed or timed-out run")
+    parser.add_argument("--log_dir", default="designite_logs", help="Per-job Designite logs (kept out of --output_dir, which count_smell_types.py walks)")
+
+
+def run_designite(args):
+    workers = args.workers or default_workers(args.memory_per_job_mb)
+
+    jobs = collect_jobs(args.trees, args.output_dir)
+    if args.skip_existing:
+        jobs = [job for job in jobs
+                if not os.path.exists(os.path.join(job["output"], "designCodeSmells.csv"))]
+    print(f"Running {len(jobs)} Designite jobs on {workers} workers")
+
+    start_time = time.time()
+    results = run_jobs(jobs, args, workers)
+
+    manifest = {
+        "jar": args.jar,
+        "command": "DesigniteServer" if args.server else designite_command(args.java, args.jar, args.memory_per_job_mb, workers),
+        "workers": workers,
+        "timeout": args.timeout,
+        "retries": args.retries,
+        "wall_seconds": time.time() - start_time,
+        "failed": sum(result["status"] != "ok" for result in results),
+        "jobs": sorted(results, key=lambda result: (result["tree"], result["project"]))
+    }
+    os.makedirs(os.path.dirname(args.manifest) or ".", exist_ok=True)
+    with open(args.manifest, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+    print(f"All projects processed in {manifest['wall_seconds']:.1f}s, {manifest['failed']} failed. Manifest: {args.manifest}")
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run DesigniteJava on every project folder of the extracted trees in parallel.")
+    parser.add_argument("trees", nargs="*", default=TREES, help="Tree directories to analyse")
+    parser.add_argument("--output_dir", default=CODE_SMELL_DIRECTORY, help="Directory receiving <tree>/<project>_smells")
+    parser.add_argument("--skip_existing", action="store_true", help="Skip projects that already have designCodeSmells.csv")
+    add_runner_arguments(parser)
+    parser.add_argument("--manifest", default="designite_manifest.json", help="JSON run manifest")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.jar):
+        print(f"DesigniteJava.jar not found at path: {args.jar}")
+        raise SystemExit(1)
+    manifest = run_designite(args)
+    raise SystemExit(1 if manifest["failed"] else 0)
@@ -0,0 +1,34 @@
+import os
+import pandas as pd
+
+DISTRIBUTION_CSV = "code_smell_type_distribution.csv"
+CATEGORY_COLUMNS = ["Project Folder", "Sub Folder", "Type Name", "Code Smell"]
+COUNT_COLUMN = "Code Smell Count"
+
+
+def parquet_path_for(csv_path):
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+
+# Columnar copy of the distribution CSV: the four key columns as categoricals, the count as int64
+def save_distribution_parquet(distribution, csv_path=DISTRIBUTION_CSV):
+    table = pd.DataFrame()
+    for column in CATEGORY_COLUMNS:
+        values = distribution[column].astype(str)
+        # Sorted categories make groupby() on them iterate in the same order as on plain strings
+        table[column] = pd.Categorical(values, categories=sorted(values.unique()))
+    table[COUNT_COLUMN] = distribution[COUNT_COLUMN].astype("int64")
+    parquet_path = parquet_path_for(csv_path)
+    table.to_parquet(parquet_path, index=False)
+    return parquet_path
+
+
+# The Parquet edition when it is at least as new as the CSV, otherwise the CSV itself.
+# Group by the categorical columns with observed=True so unused categories are not listed.
+def load_distribution(csv_path=DISTRIBUTION_CSV):
+    parquet_path = parquet_path_for(csv_path)
+    if os.path.exists(parquet_path) and (not os.path.exists(csv_path)
+                                         or os.path.getmtime(parquet_path) >= os.path.getmtime(csv_path)):
+        return pd.read_parquet(parquet_path)
+    # Keys stay text, as in the Parquet edition: a type named "None" or "NA" must not become NaN
+    return pd.read_csv(csv_path, dtype={column: str for column in CATEGORY_COLUMNS}, keep_default_na=False)
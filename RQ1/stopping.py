@@ -0,0 +1,157 @@
+import time
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList
+from early_stopping import TEMPLATE_MARKERS, truncate_at_markers
+
+class GeneratedText:
+    # Incrementally decodes the generated part of every row so the criteria below
+    # only look at each new token once
+
+    def __init__(self, tokenizer, prompt_length, batch_size):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.decoded_length = prompt_length
+        self.texts = [""] * batch_size
+        self.new_texts = [""] * batch_size
+
+    def update(self, input_ids):
+        if input_ids.shape[-1] == self.decoded_length:
+            return
+        new_ids = input_ids[:, self.decoded_length:].tolist()
+        self.new_texts = [self.tokenizer.decode(ids, skip_special_tokens=True) for ids in new_ids]
+        self.texts = [text + new_text for text, new_text in zip(self.texts, self.new_texts)]
+        self.decoded_length = input_ids.shape[-1]
+
+    @property
+    def generated_tokens(self):
+        return self.decoded_length - self.prompt_length
+
+
+class RecordingCriteria(StoppingCriteria):
+    # Base class remembering, per row, how many tokens had been generated when it first fired
+
+    reason = ""
+
+    def __init__(self, generated_text):
+        self.generated_text = generated_text
+        self.stopped_at = [None] * len(generated_text.texts)
+
+    def __call__(self, input_ids, scores, **kwargs):
+        self.generated_text.update(input_ids)
+        done = [self.should_stop(row) for row in range(input_ids.shape[0])]
+        for row, stop in enumerate(done):
+            if stop and self.stopped_at[row] is None:
+                self.stopped_at[row] = self.generated_text.generated_tokens
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+    def should_stop(self, row):
+        raise NotImplementedError
+
+
+class TemplateMarkerCriteria(RecordingCriteria):
+    reason = "template marker"
+
+    def __init__(self, generated_text, markers=TEMPLATE_MARKERS):
+        super().__init__(generated_text)
+        self.markers = markers
+
+    def should_stop(self, row):
+        text = self.generated_text.texts[row]
+        return len(truncate_at_markers(text, self.markers)) < len(text)
+
+
+class BraceBalanceCriteria(RecordingCriteria):
+    # Stops once the output has closed as many top-level blocks as the input had
+
+    reason = "balanced braces"
+
+    def __init__(self, generated_text, target_blocks):
+        super().__init__(generated_text)
+        self.target_blocks = target_blocks
+        self.depth = [0] * len(target_blocks)
+        self.blocks = [0] * len(target_blocks)
+
+    def should_stop(self, row):
+        if self.target_blocks[row] is None:
+            return False
+        for char in self.generated_text.new_texts[row]:
+            if char == "{":
+                self.depth[row] += 1
+            elif char == "}":
+                self.depth[row] -= 1
+                if self.depth[row] == 0:
+                    self.blocks[row] += 1
+        return self.depth[row] == 0 and self.blocks[row] >= self.target_blocks[row]
+
+
+class TimeBudgetCriteria(RecordingCriteria):
+    reason = "time budget"
+
+    def __init__(self, generated_text, seconds):
+        super().__init__(generated_text)
+        self.deadline = time.time() + seconds
+
+    def should_stop(self, row):
+        return time.time() >= self.deadline
+
+
+class GenerationTimer(StoppingCriteria):
+    # Never stops generation; only notes when it is first called, which is right after the
+    # first new token exists and therefore marks the end of prefill
+
+    def __init__(self, device):
+        self.device = device
+        self.uses_cuda = str(device).startswith("cuda") and torch.cuda.is_available()
+        self.start_time = None
+        self.first_token_time = None
+        self.end_time = None
+
+    # CUDA kernels run asynchronously, so wait for the queued work before reading the clock;
+    # otherwise the first call marks when prefill was queued rather than when it finished.
+    # Only start, the first token and stop synchronize, so decoding is not slowed down.
+    def now(self):
+        if self.uses_cuda:
+            torch.cuda.synchronize(self.device)
+        return time.perf_counter()
+
+    def start(self):
+        if self.uses_cuda:
+            torch.cuda.reset_peak_memory_stats(self.device)
+        self.start_time = self.now()
+
+    def stop(self):
+        self.end_time = self.now()
+
+    @property
+    def elapsed(self):
+        return self.end_time - self.start_time
+
+    def peak_accelerator_mb(self):
+        return torch.cuda.max_memory_allocated(self.device) / 2 ** 20 if self.uses_cuda else None
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if self.first_token_time is None:
+            self.first_token_time = self.now()
+        return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+
+
+class StopMonitor:
+    def __init__(self, criteria):
+        self.criteria = criteria
+        self.stopping_criteria = StoppingCriteriaList(criteria)
+
+    # First criterion that fired for the row and the number of tokens generated at that point
+    def stop_reason(self, row):
+        fired = [(criterion.stopped_at[row], criterion.reason) for criterion in self.criteria
+                 if criterion.stopped_at[row] is not None]
+        return min(fired) if fired else None
+
+    # Prints the early stop of the row and returns the fields recorded in its telemetry
+    def log(self, row, max_new_tokens):
+        stop = self.stop_reason(row)
+        if stop is None:
+            return {"stop_reason": None, "tokens_saved": 0}
+        generated_tokens, reason = stop
+        tokens_saved = max_new_tokens - generated_tokens
+        print(f"Stopped early ({reason}) after {generated_tokens} tokens, saved {tokens_saved} tokens")
+        return {"stop_reason": reason, "tokens_saved": tokens_saved}
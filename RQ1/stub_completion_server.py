@@ -0,0 +1,76 @@
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Minimal offline stand-in for an OpenAI-compatible completion server, used to exercise
+# the --backend openai path of the inference scripts without a GPU or network access.
+# It "refactors" by echoing back the unrefactored code found in the prompt.
+
+START_MARKER = "# unrefactored code"
+END_MARKER = "# refactored version"
+
+
+def echo_completion(prompt):
+    start = prompt.rfind(START_MARKER)
+    end = prompt.rfind(END_MARKER)
+    if start == -1 or end <= start:
+        return ""
+    return prompt[prompt.index("\n", start) + 1:end].strip() + "\n"
+
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    fail_rate = 0.0
+    reject_rate = 0.0
+
+    def do_POST(self):
+        if self.path != "/v1/completions":
+            self.send_error(404)
+            return
+        if random.random() < self.fail_rate:
+            self.send_error(503, "Injected failure")
+            return
+        if random.random() < self.reject_rate:
+            self.send_error(400, "Injected rejection: prompt longer than max_model_len")
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length))
+        time.sleep(self.delay)
+
+        prompt = request.get("prompt", "")
+        text = echo_completion(prompt)
+        # Whitespace-separated words stand in for tokens
+        usage = {"prompt_tokens": len(prompt.split()), "completion_tokens": len(text.split())}
+        body = json.dumps({
+            "object": "text_completion",
+            "model": request.get("model", "stub"),
+            "choices": [{"index": 0, "text": text, "finish_reason": "stop"}],
+            "usage": usage
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stub completion server.")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before answering each request")
+    parser.add_argument("--fail_rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 503")
+    parser.add_argument("--reject_rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 400")
+    args = parser.parse_args()
+
+    CompletionHandler.delay = args.delay
+    CompletionHandler.fail_rate = args.fail_rate
+    CompletionHandler.reject_rate = args.reject_rate
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), CompletionHandler)
+    print(f"Stub completion server listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,71 @@
+import argparse
+import json
+import math
+import resource
+
+SUMMARY_PERCENTILES = [50, 90, 99]
+
+
+# Structured timing of one generate() call; times are perf_counter() readings in seconds.
+# first_token_time is when the first new token existed, which ends the prefill phase; it is
+# None when the phases cannot be told apart (e.g. a non-streaming server request).
+def generation_telemetry(start_time, first_token_time, end_time, prompt_tokens, generated_tokens,
+                         tokenize_ms=None, peak_accelerator_mb=None):
+    total_ms = (end_time - start_time) * 1000
+    first_token_ms = (first_token_time - start_time) * 1000 if first_token_time is not None else None
+    return {
+        "prompt_tokens": prompt_tokens,
+        "generated_tokens": generated_tokens,
+        "tokenize_ms": tokenize_ms,
+        "prefill_ms": first_token_ms,
+        "decode_ms": total_ms - first_token_ms if first_token_ms is not None else None,
+        "time_to_first_token_ms": first_token_ms,
+        "tokens_per_second": generated_tokens / total_ms * 1000 if generated_tokens is not None and total_ms > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_accelerator_mb": peak_accelerator_mb
+    }
+
+
+# Peak resident set size of this process so far (ru_maxrss is in kilobytes on Linux)
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(sorted_values, q):
+    # Nearest-rank percentile
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(output_file_path):
+    values = {}
+    records = 0
+    with open(output_file_path, "r") as results_file:
+        for line in results_file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records += 1
+            metrics = dict(record.get("telemetry") or {})
+            metrics["generation_time"] = record.get("generation_time")
+            for name, value in metrics.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    values.setdefault(name, []).append(value)
+
+    print(f"Records: {records}")
+    header = f"{'metric':<24}{'count':>8}{'mean':>12}" + "".join(f"{'p' + str(q):>12}" for q in SUMMARY_PERCENTILES) + f"{'max':>12}"
+    print(header)
+    for name, metric_values in values.items():
+        metric_values.sort()
+        row = f"{name:<24}{len(metric_values):>8}{sum(metric_values) / len(metric_values):>12.2f}"
+        row += "".join(f"{percentile(metric_values, q):>12.2f}" for q in SUMMARY_PERCENTILES)
+        row += f"{metric_values[-1]:>12.2f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize the generation telemetry of an inference output file.")
+    parser.add_argument("output_file", help="Path to the JSONL results file")
+    args = parser.parse_args()
+    summarize(args.output_file)
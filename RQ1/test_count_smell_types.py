@@ -0,0 +1,62 @@
+import csv
+import os
+import sys
+import tempfile
+import unittest
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from count_smell_types import count_file, count_smells_in_file, read_smells
+
+# Columns a type-inferring CSV reader would rewrite: only when every cell of a column looks like a
+# boolean, a number or a null does it stop being read as text
+TRICKY_COLUMNS = [
+    ["TRUE", "true", "FALSE", "False"],
+    ["NaN", "nan", "NA", "", "null"],
+    ["Infinity", "-inf", "1e3", "-0"],
+    ["007", "010", "1"],
+    ["None", "N/A", " padded "],
+]
+
+
+def write_design_csv(path, values):
+    with open(path, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(["Project Name", "Package Name", "Type Name", "Code Smell"])
+        for type_name in values:
+            for code_smell in values:
+                writer.writerow(["project", "package", type_name, code_smell])
+
+
+def dict_reader_counts(path):
+    with open(path, mode='r', newline='', encoding='utf-8') as file:
+        return Counter((row['Type Name'], row['Code Smell']) for row in csv.DictReader(file))
+
+
+class ReadSmellsTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "designCodeSmells.csv")
+
+    def test_read_smells_keeps_cells_as_csv_module_reads_them(self):
+        for values in TRICKY_COLUMNS:
+            with self.subTest(values=values):
+                write_design_csv(self.path, values)
+                with open(self.path, 'rb') as file:
+                    smells = read_smells(self.path, file.read())
+                expected = count_smells_in_file(self.path)
+                self.assertEqual(smells.values.tolist(), expected.values.tolist())
+
+    def test_count_file_matches_dict_reader_counts(self):
+        for values in TRICKY_COLUMNS:
+            with self.subTest(values=values):
+                write_design_csv(self.path, values)
+                entry = count_file((self.path, None))
+                counts = Counter({(type_name, code_smell): count for type_name, code_smell, count in entry["counts"]})
+                self.assertEqual(counts, dict_reader_counts(self.path))
+                self.assertEqual(entry["rows"], len(values) ** 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
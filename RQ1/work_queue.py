@@ -0,0 +1,63 @@
+import sqlite3
+import time
+
+PENDING, LEASED, DONE = "pending", "leased", "done"
+
+
+class WorkQueue:
+    # SQLite-backed queue of dataset line numbers shared by the inference workers.
+    # A worker leases an item for a limited time and acks it once every file of the commit
+    # is written. Leases of a worker that dies expire (or are released by the launcher)
+    # and the item goes back to the other workers.
+
+    def __init__(self, db_path):
+        self.connection = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            "line_number INTEGER PRIMARY KEY, status TEXT NOT NULL, owner TEXT, "
+            "lease_expires REAL, attempts INTEGER NOT NULL DEFAULT 0)")
+
+    def populate(self, line_numbers):
+        self.connection.execute("BEGIN IMMEDIATE")
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO items (line_number, status) VALUES (?, ?)",
+            ((line_number, PENDING) for line_number in line_numbers))
+        self.connection.execute("COMMIT")
+
+    def lease(self, owner, lease_seconds):
+        now = time.time()
+        self.connection.execute("BEGIN IMMEDIATE")
+        row = self.connection.execute(
+            "SELECT line_number FROM items WHERE status = ? OR (status = ? AND lease_expires < ?) "
+            "ORDER BY line_number LIMIT 1", (PENDING, LEASED, now)).fetchone()
+        if row is not None:
+            self.connection.execute(
+                "UPDATE items SET status = ?, owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE line_number = ?",
+                (LEASED, owner, now + lease_seconds, row[0]))
+        self.connection.execute("COMMIT")
+        return row[0] if row is not None else None
+
+    # Extend a lease while a long commit is still being processed
+    def renew(self, line_number, owner, lease_seconds):
+        self.connection.execute(
+            "UPDATE items SET lease_expires = ? WHERE line_number = ? AND owner = ? AND status = ?",
+            (time.time() + lease_seconds, line_number, owner, LEASED))
+
+    def ack(self, line_number, owner):
+        self.connection.execute(
+            "UPDATE items SET status = ?, lease_expires = NULL WHERE line_number = ? AND owner = ?",
+            (DONE, line_number, owner))
+
+    # Hand the leases of a dead worker back to the queue immediately
+    def release(self, owner):
+        cursor = self.connection.execute(
+            "UPDATE items SET status = ?, owner = NULL, lease_expires = NULL WHERE owner = ? AND status = ?",
+            (PENDING, owner, LEASED))
+        return cursor.rowcount
+
+    def remaining(self):
+        return self.connection.execute("SELECT COUNT(*) FROM items WHERE status != ?", (DONE,)).fetchone()[0]
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,70 @@
+import argparse
+import time
+import numpy as np
+from effect_sizes import cohen_d, cohen_ds, sample_moments, cliffs_delta, cliffs_deltas
+
+# Time the searchsorted Cliff's delta on growing samples, and check it against the
+# pairwise double loop rq2.py and rq3.py used as long as that loop stays affordable.
+
+def pairwise_cliffs_delta(x, y):
+    greater = 0
+    less = 0
+    for i in x:
+        for j in y:
+            if i > j:
+                greater += 1
+            elif i < j:
+                less += 1
+    return (greater - less) / (len(x) * len(y))
+
+def reductions(rng, size):
+    # Small integer smell reductions with many ties, like the per-file reductions in rq3.py
+    return rng.integers(-5, 20, size=size).tolist()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the searchsorted Cliff's delta against the pairwise loop.")
+    parser.add_argument('--max_size', type=int, default=1000000, help='Largest number of observations per side')
+    parser.add_argument('--max_pairwise_size', type=int, default=2000, help='Largest size also run through the pairwise loop')
+    parser.add_argument('--groups', type=int, default=1000, help='Groups in the vectorized many-group run')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    size = 10
+    while size <= args.max_size:
+        x, y = reductions(rng, size), reductions(rng, size)
+        start_time = time.perf_counter()
+        delta = cliffs_delta(x, y)
+        sorted_seconds = time.perf_counter() - start_time
+        line = f"n = m = {size:>8}: searchsorted {sorted_seconds:.4f} s"
+        if size <= args.max_pairwise_size:
+            start_time = time.perf_counter()
+            expected = pairwise_cliffs_delta(x, y)
+            pairwise_seconds = time.perf_counter() - start_time
+            line += f", pairwise {pairwise_seconds:.4f} s, identical: {delta == expected}"
+        print(line)
+        size *= 10
+
+    x_groups = [reductions(rng, rng.integers(2, 200)) for _ in range(args.groups)]
+    y_groups = [reductions(rng, rng.integers(2, 200)) for _ in range(args.groups)]
+    start_time = time.perf_counter()
+    deltas = cliffs_deltas(x_groups, y_groups)
+    grouped_seconds = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    expected = [cliffs_delta(x, y) for x, y in zip(x_groups, y_groups)]
+    single_seconds = time.perf_counter() - start_time
+    print(f"{args.groups} groups: vectorized {grouped_seconds:.4f} s, one call per group {single_seconds:.4f} s, "
+          f"identical: {deltas.tolist() == expected}")
+
+    # Cohen's d of the same groups from their moments, against one cohen_d call per group
+    start_time = time.perf_counter()
+    ds = cohen_ds(*sample_moments(x_groups), *sample_moments(y_groups))
+    grouped_seconds = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    expected = [cohen_d(x, y) for x, y in zip(x_groups, y_groups)]
+    single_seconds = time.perf_counter() - start_time
+    print(f"{args.groups} groups, Cohen's d: vectorized {grouped_seconds:.4f} s, one call per group {single_seconds:.4f} s, "
+          f"max difference: {np.max(np.abs(ds - expected)):.2e}")
+
+if __name__ == "__main__":
+    main()
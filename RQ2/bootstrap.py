@@ -0,0 +1,85 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from count_histograms import CountHistogram
+from effect_sizes import cohen_ds
+
+
+# rq2.py and rq3.py run at module level, so pool workers are forked rather than re-importing them
+def fork_context():
+    return multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+
+
+# Distinct values and frequencies of a sample given as an array/list or a CountHistogram
+def _value_counts(sample):
+    if isinstance(sample, CountHistogram):
+        return sample.arrays()
+    values, counts = np.unique(np.asarray(sample), return_counts=True)
+    return values, counts.astype(np.int64)
+
+
+# Resampling n values with replacement only changes how often each distinct value occurs, so one
+# replicate is a multinomial draw over the distinct values and both effect sizes follow from the
+# resampled frequencies in O(distinct values) instead of O(n)
+def _group_replicates(task):
+    x, y, n_bootstrap, seed, chunk_size = task
+    x_values, x_counts = _value_counts(x)
+    y_values, y_counts = _value_counts(y)
+    values = np.union1d(x_values, y_values)
+    x_probabilities = np.zeros(len(values))
+    y_probabilities = np.zeros(len(values))
+    nx, ny = int(x_counts.sum()), int(y_counts.sum())
+    x_probabilities[np.searchsorted(values, x_values)] = x_counts / nx
+    y_probabilities[np.searchsorted(values, y_values)] = y_counts / ny
+    values = values.astype(np.float64)
+
+    rng = np.random.default_rng(seed)
+    d_replicates = np.empty(n_bootstrap)
+    delta_replicates = np.empty(n_bootstrap)
+    for start in range(0, n_bootstrap, chunk_size):
+        size = min(chunk_size, n_bootstrap - start)
+        x_draws = rng.multinomial(nx, x_probabilities, size=size)
+        y_draws = rng.multinomial(ny, y_probabilities, size=size)
+
+        # Cliff's delta: every resampled x value against the resampled y values below and above it
+        y_cumulative = np.cumsum(y_draws, axis=1)
+        y_below = y_cumulative - y_draws
+        y_above = ny - y_cumulative
+        delta_replicates[start:start + size] = (x_draws * (y_below - y_above)).sum(axis=1) / (nx * ny)
+
+        # Cohen's d of every replicate in the chunk at once, from the first two moments
+        d_replicates[start:start + size] = cohen_ds(nx, x_draws @ values, x_draws @ values ** 2,
+                                                    ny, y_draws @ values, y_draws @ values ** 2)
+    return d_replicates, delta_replicates
+
+
+def _interval(replicates, confidence):
+    tail = (1 - confidence) / 2 * 100
+    replicates = replicates[np.isfinite(replicates)]
+    if not len(replicates):
+        return (np.nan, np.nan)
+    low, high = np.percentile(replicates, [tail, 100 - tail])
+    return (float(low), float(high))
+
+
+# Percentile bootstrap intervals of Cohen's d and Cliff's delta for every (x, y) group. Every group
+# gets its own stream spawned from the seed, so the intervals depend on the seed and chunk_size but not on the
+# number of workers.
+def bootstrap_intervals(groups, n_bootstrap=10000, seed=0, confidence=0.95, chunk_size=1000, workers=1):
+    seeds = np.random.SeedSequence(seed).spawn(len(groups))
+    tasks = [(x, y, n_bootstrap, group_seed, chunk_size) for (x, y), group_seed in zip(groups, seeds)]
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=fork_context()) as executor:
+            replicates = list(executor.map(_group_replicates, tasks))
+    else:
+        replicates = [_group_replicates(task) for task in tasks]
+    return [{'cohen_d': _interval(d_replicates, confidence), 'cliffs_delta': _interval(delta_replicates, confidence)}
+            for d_replicates, delta_replicates in replicates]
+
+
+def format_intervals(intervals, confidence=0.95):
+    level = f"{confidence * 100:g}%"
+    cohen_low, cohen_high = intervals['cohen_d']
+    delta_low, delta_high = intervals['cliffs_delta']
+    return (f"Cohen's d {level} CI: [{cohen_low}, {cohen_high}], "
+            f"Cliff's Delta {level} CI: [{delta_low}, {delta_high}]")
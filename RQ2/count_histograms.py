@@ -0,0 +1,147 @@
+import json
+import numpy as np
+from scipy import special
+from scipy.stats import mannwhitneyu as scipy_mannwhitneyu
+from effect_sizes import cohen_ds
+
+
+class CountHistogram:
+    # A sample of small integers stored as value -> frequency. Histograms of shards merge by adding
+    # frequencies (save_shard/load_shards), so a sample can be collected across models and projects
+    # without keeping the raw values.
+
+    def __init__(self, counts=None):
+        self.counts = dict(counts or {})
+
+    @classmethod
+    def from_values(cls, values):
+        values, counts = np.unique(np.asarray(values), return_counts=True)
+        return cls(zip(values.tolist(), counts.tolist()))
+
+    # Same call as list.append, so code collecting lists can collect histograms instead
+    def append(self, value, count=1):
+        if isinstance(value, np.generic):
+            value = value.item()
+        self.counts[value] = self.counts.get(value, 0) + count
+
+    def update(self, other):
+        for value, count in other.counts.items():
+            self.append(value, count)
+        return self
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    # Distinct values in ascending order and their frequencies
+    def arrays(self):
+        values = sorted(self.counts)
+        return np.array(values), np.array([self.counts[value] for value in values], dtype=np.int64)
+
+    def values(self):
+        values, counts = self.arrays()
+        return np.repeat(values, counts)
+
+
+# A shard holds the LLM and developer histogram of every group (code smell or refactoring type) of one run
+def save_shard(path, llm_samples, developer_samples):
+    shard = {side: [[group, sorted(histogram.counts.items())] for group, histogram in samples.items()]
+             for side, samples in (('llm', llm_samples), ('developer', developer_samples))}
+    with open(path, 'w') as file:
+        json.dump(shard, file)
+
+
+# Merge shards by adding the frequencies of each group; groups keep their order of first appearance
+def load_shards(paths):
+    merged = {'llm': {}, 'developer': {}}
+    for path in paths:
+        with open(path, 'r') as file:
+            shard = json.load(file)
+        for side, samples in merged.items():
+            for group, counts in shard[side]:
+                histogram = samples.setdefault(group, CountHistogram())
+                for value, count in counts:
+                    histogram.append(value, count)
+    return merged['llm'], merged['developer']
+
+
+# Frequencies of both histograms on their common ascending value grid
+def _aligned(x, y):
+    x_values, x_counts = x.arrays()
+    y_values, y_counts = y.arrays()
+    values = np.union1d(x_values, y_values)
+    x_aligned = np.zeros(len(values), dtype=np.int64)
+    y_aligned = np.zeros(len(values), dtype=np.int64)
+    x_aligned[np.searchsorted(values, x_values)] = x_counts
+    y_aligned[np.searchsorted(values, y_values)] = y_counts
+    return x_aligned, y_aligned
+
+
+# scipy.stats.mannwhitneyu(x, y) from the two histograms. Each distinct value
+# is one tie group whose average rank follows from the cumulative frequencies, so the work is
+# O(distinct values). Small samples without ties use scipy's exact distribution, as scipy does.
+def mannwhitneyu(x, y, use_continuity=True, alternative='two-sided'):
+    x_counts, y_counts = _aligned(x, y)
+    n1, n2 = int(x_counts.sum()), int(y_counts.sum())
+    t = x_counts + y_counts
+    if not (n1 > 8 and n2 > 8) and not (t > 1).any():
+        return scipy_mannwhitneyu(x.values(), y.values(), use_continuity=use_continuity, alternative=alternative)
+
+    # Twice the average rank of a tie group is an integer: 2 * (values below) + t + 1
+    twice_ranks = 2 * (np.cumsum(t) - t) + t + 1
+    R1 = float(int((x_counts * twice_ranks).sum())) / 2
+    U1 = R1 - n1 * (n1 + 1) / 2
+    U2 = n1 * n2 - U1
+    if alternative == 'greater':
+        U, f = U1, 1
+    elif alternative == 'less':
+        U, f = U2, 1
+    else:
+        U, f = max(U1, U2), 2
+
+    # Normal approximation with tie and continuity correction, as scipy's asymptotic method
+    mu = n1 * n2 / 2
+    n = n1 + n2
+    ties = t.astype(np.float64)
+    tie_term = np.sum(ties ** 3 - ties)
+    s = np.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))))
+    numerator = U - mu
+    if use_continuity:
+        numerator -= 0.5
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = numerator / s
+    p = np.clip(special.ndtr(-z) * f, 0., 1.)
+    return np.float64(U1), np.float64(p)
+
+
+# Same counts as the pairwise loop: every x value against the y values below and above it
+def cliffs_delta(x, y):
+    x_counts, y_counts = _aligned(x, y)
+    y_below = np.cumsum(y_counts) - y_counts
+    y_above = int(y_counts.sum()) - np.cumsum(y_counts)
+    difference = int((x_counts * (y_below - y_above)).sum())
+    return difference / (len(x) * len(y))
+
+
+# Each histogram is already O(distinct values), so groups are simply taken one at a time
+def cliffs_deltas(x_groups, y_groups):
+    return [cliffs_delta(x, y) for x, y in zip(x_groups, y_groups)]
+
+
+# Pooled-SD Cohen's d from the histograms' exact integer moments; equals effect_sizes.cohen_d up to float rounding
+def cohen_d(x, y):
+    moments = []
+    for histogram in (x, y):
+        n = len(histogram)
+        total = sum(value * count for value, count in histogram.counts.items())
+        squares = sum(value * value * count for value, count in histogram.counts.items())
+        moments.extend([n, total, squares])
+    return np.float64(cohen_ds(*moments))
+
+
+def median(histogram):
+    values, counts = histogram.arrays()
+    n = int(counts.sum())
+    cumulative = np.cumsum(counts)
+    lower = values[np.searchsorted(cumulative, (n - 1) // 2, side='right')]
+    upper = values[np.searchsorted(cumulative, n // 2, side='right')]
+    return np.mean([lower, upper])
@@ -0,0 +1,80 @@
+import numpy as np
+
+
+# Cohen's d with the pooled standard deviation
+def cohen_d(x, y):
+    nx = len(x)
+    ny = len(y)
+    dof = nx + ny - 2
+    pooled_std = np.sqrt(((nx - 1) * np.std(x, ddof=1) ** 2 + (ny - 1) * np.std(y, ddof=1) ** 2) / dof)
+    return (np.mean(x) - np.mean(y)) / pooled_std
+
+
+# Sizes, sums and sums of squares of many samples at once
+def sample_moments(groups):
+    sizes = np.array([len(group) for group in groups], dtype=np.int64)
+    values = np.concatenate([np.asarray(group, dtype=np.float64) for group in groups]) if len(groups) else np.array([])
+    group_ids = np.repeat(np.arange(len(groups)), sizes)
+    sums = np.bincount(group_ids, weights=values, minlength=len(groups))
+    squares = np.bincount(group_ids, weights=values ** 2, minlength=len(groups))
+    return sizes, sums, squares
+
+
+# Pooled-SD Cohen's d of many groups at once from the moments of their x and y samples; the arguments
+# are arrays over groups (or bootstrap replicates) or scalars. (n - 1) * variance = squares - sum^2 / n,
+# so no group needs its values again. Equals cohen_d up to float rounding.
+def cohen_ds(nx, x_sums, x_squares, ny, y_sums, y_squares):
+    pooled_variance = ((x_squares - x_sums ** 2 / nx) + (y_squares - y_sums ** 2 / ny)) / (nx + ny - 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (x_sums / nx - y_sums / ny) / np.sqrt(pooled_variance)
+
+
+# NaN compares neither greater nor less than anything, so it only adds to the number of pairs
+def _comparable(values):
+    values = np.asarray(values)
+    if values.dtype.kind == 'f':
+        values = values[~np.isnan(values)]
+    return values
+
+
+# Cliff's delta from sorted y: for each x, searchsorted counts the y below and above it,
+# so (n + m) log m instead of comparing every pair
+def cliffs_delta(x, y):
+    nx = len(x)
+    ny = len(y)
+    x_values = _comparable(x)
+    y_sorted = np.sort(_comparable(y))
+    greater = int(np.searchsorted(y_sorted, x_values, side='left').sum())
+    less = int((len(y_sorted) - np.searchsorted(y_sorted, x_values, side='right')).sum())
+    # Python ints, so the division rounds exactly as (greater - less) / (nx * ny) always has
+    return (greater - less) / (nx * ny)
+
+
+# Cliff's delta of many (x, y) groups at once. Values are replaced by their rank among all values
+# and offset by group, so one sort and two searchsorted calls cover every group.
+def cliffs_deltas(x_groups, y_groups):
+    pair_counts = [len(x) * len(y) for x, y in zip(x_groups, y_groups)]
+    x_groups = [_comparable(x) for x in x_groups]
+    y_groups = [_comparable(y) for y in y_groups]
+    if not x_groups:
+        return np.array([])
+    x_sizes = np.array([len(x) for x in x_groups], dtype=np.int64)
+    y_sizes = np.array([len(y) for y in y_groups], dtype=np.int64)
+
+    x_all = np.concatenate(x_groups)
+    y_all = np.concatenate(y_groups)
+    _, ranks = np.unique(np.concatenate([x_all, y_all]), return_inverse=True)
+    ranks = ranks.reshape(-1).astype(np.int64)
+    stride = ranks.max(initial=0) + 1
+    x_group = np.repeat(np.arange(len(x_groups), dtype=np.int64), x_sizes)
+    x_keys = x_group * stride + ranks[:len(x_all)]
+    y_keys = np.sort(np.repeat(np.arange(len(y_groups), dtype=np.int64), y_sizes) * stride + ranks[len(x_all):])
+
+    # y values of the x value's own group that sort below and above it
+    y_starts = np.concatenate([[0], np.cumsum(y_sizes)[:-1]])
+    below = np.searchsorted(y_keys, x_keys, side='left') - y_starts[x_group]
+    above = y_starts[x_group] + y_sizes[x_group] - np.searchsorted(y_keys, x_keys, side='right')
+    differences = np.zeros(len(x_groups), dtype=np.int64)
+    np.add.at(differences, x_group, below - above)
+    return np.array([int(difference) / pairs if pairs else np.nan
+                     for difference, pairs in zip(differences, pair_counts)])
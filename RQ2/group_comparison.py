@@ -0,0 +1,103 @@
+import numpy as np
+from bootstrap import bootstrap_intervals, format_intervals
+from permutation_tests import permutation_tests, format_permutation
+
+
+# Options shared by rq2.py and rq3.py: the statistics engine, shards, bootstrap intervals and permutation tests
+def add_comparison_arguments(parser):
+    parser.add_argument('--engine', choices=['arrays', 'histogram'], default='arrays',
+                        help='Collect the reductions as arrays or as value -> frequency histograms')
+    parser.add_argument('--save_shard', default=None,
+                        help='Also save the reduction histograms of this run to this JSON file (histogram engine)')
+    parser.add_argument('--shards', nargs='+', default=None,
+                        help='Merge the reduction histograms of these saved shards instead of reading the data (histogram engine)')
+    parser.add_argument('--n_bootstrap', type=int, default=10000,
+                        help='Bootstrap replicates for the effect size confidence intervals (0 to skip them)')
+    parser.add_argument('--bootstrap_seed', type=int, default=0, help='Seed of the bootstrap resampling')
+    parser.add_argument('--bootstrap_workers', type=int, default=1, help='Processes resampling the groups in parallel')
+    parser.add_argument('--permutation', choices=['mean', 'median'], default=None,
+                        help='Also run a permutation test on the difference in this statistic')
+    parser.add_argument('--n_permutations', type=int, default=9999, help='Random permutations when the exact test is too large')
+    parser.add_argument('--max_exact_permutations', type=int, default=100000,
+                        help='Enumerate every relabelling when there are at most this many')
+    parser.add_argument('--permutation_block_mb', type=int, default=64, help='Memory for one block of shuffled index arrays')
+    parser.add_argument('--permutation_seed', type=int, default=0, help='Seed of the random permutations')
+    parser.add_argument('--permutation_workers', type=int, default=1, help='Processes testing the groups in parallel')
+
+
+def parse_comparison_arguments(parser):
+    args = parser.parse_args()
+    if (args.save_shard or args.shards) and args.engine != 'histogram':
+        parser.error('--save_shard and --shards need --engine histogram')
+    return args
+
+
+def _as_list(values):
+    return np.asarray(values).tolist()
+
+
+# Constructors of an empty sample and of a sample holding the given values, for the engine
+def sample_types(engine):
+    if engine == 'histogram':
+        from count_histograms import CountHistogram
+        return CountHistogram, CountHistogram.from_values
+    return list, _as_list
+
+
+def _statistics(engine):
+    if engine == 'histogram':
+        from count_histograms import mannwhitneyu, cohen_d, cliffs_deltas, median
+        return mannwhitneyu, cohen_d, cliffs_deltas, median
+    from scipy.stats import mannwhitneyu
+    from effect_sizes import cohen_d, cliffs_deltas
+    return mannwhitneyu, cohen_d, cliffs_deltas, np.median
+
+
+# Compare the LLM and developer samples of every group (group -> (llm, developer), in report order):
+# Mann-Whitney U tests, effect sizes of the significant groups, and optionally permutation tests and
+# bootstrap intervals. Prints one line per group labelled with label and returns the significant lines.
+def compare_groups(groups, label, args):
+    mannwhitneyu, cohen_d, cliffs_deltas, median = _statistics(args.engine)
+    testable = [group for group, (llm_array, developer_array) in groups.items()
+                if len(llm_array) > 1 and len(developer_array) > 1]
+
+    # Permutation tests of every group with enough data points, batched across groups
+    permutation_results = {}
+    if args.permutation:
+        tests = permutation_tests([groups[group] for group in testable],
+                                  args.permutation, args.n_permutations, args.max_exact_permutations,
+                                  args.permutation_block_mb * 2 ** 20, args.permutation_seed, args.permutation_workers)
+        permutation_results = {group: f', {format_permutation(test, args.permutation)}' for group, test in zip(testable, tests)}
+
+    # Mann-Whitney U tests of the same groups, then Cliff's delta of the significant ones in one batch
+    u_tests = {group: mannwhitneyu(*groups[group], alternative='two-sided') for group in testable}
+    significant = [group for group, (_, p_value) in u_tests.items() if p_value < 0.05]
+    deltas = dict(zip(significant, cliffs_deltas([groups[group][0] for group in significant],
+                                                 [groups[group][1] for group in significant])))
+
+    significant_results = []
+    significant_samples = []
+    print("\nMann-Whitney U Test Results:")
+    for group, (llm_array, developer_array) in groups.items():
+        if group in u_tests:  # Ensure there are enough data points for the test
+            u_stat, p_value = u_tests[group]
+            permutation = permutation_results.get(group, '')
+            if p_value < 0.05:
+                better = 'LLM' if median(llm_array) > median(developer_array) else 'Developer'
+                effect_size = cohen_d(llm_array, developer_array)
+                result = f'{label}: {group}, P-Value: {p_value}{permutation}, Better: {better}, Effect Size (Cohen\'s d): {effect_size}, Cliff\'s Delta: {deltas[group]}'
+                significant_results.append(result)
+                significant_samples.append((llm_array, developer_array))
+                print(result)
+            else:
+                print(f'{label}: {group}, Result: No significant difference{permutation}')
+        else:
+            print(f'{label}: {group}, Result: Not enough data points for Mann-Whitney U test')
+
+    # Bootstrap confidence intervals of every reported effect size, all groups in one batch
+    if args.n_bootstrap:
+        intervals = bootstrap_intervals(significant_samples, args.n_bootstrap, args.bootstrap_seed,
+                                        workers=args.bootstrap_workers)
+        significant_results = [f'{result}, {format_intervals(group_intervals)}'
+                               for result, group_intervals in zip(significant_results, intervals)]
+    return significant_results
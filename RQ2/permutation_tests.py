@@ -0,0 +1,92 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from math import comb
+import numpy as np
+from bootstrap import fork_context
+from count_histograms import CountHistogram
+
+STATISTICS = ['mean', 'median']
+
+
+def _sample_values(sample):
+    if isinstance(sample, CountHistogram):
+        return sample.values()
+    return np.asarray(sample)
+
+
+# x and y sides of a block of index rows whose first x_size columns are the x side
+def _differences(pooled, x_indices, y_indices, statistic):
+    if statistic == 'mean':
+        x_sums = pooled[x_indices].sum(axis=1)
+        y_sums = pooled.sum() - x_sums
+        return x_sums / x_indices.shape[1] - y_sums / (len(pooled) - x_indices.shape[1])
+    return np.median(pooled[x_indices], axis=1) - np.median(pooled[y_indices], axis=1)
+
+
+# Indices missing from each row of x_indices, in ascending order
+def _complement(x_indices, size):
+    mask = np.ones((len(x_indices), size), dtype=bool)
+    np.put_along_axis(mask, x_indices, False, axis=1)
+    return np.nonzero(mask)[1].reshape(len(x_indices), -1)
+
+
+# Two-sided permutation test of the difference in means or medians. Every relabelling is enumerated
+# when there are at most max_exact of them; otherwise n_permutations random shuffles are drawn.
+# Shuffles are generated block_rows at a time as index matrices, with block_rows chosen so one block of
+# indices and gathered values stays within block_bytes.
+def permutation_test(x, y, statistic='mean', n_permutations=9999, max_exact=100000, block_bytes=64 * 2 ** 20, seed=None):
+    x, y = _sample_values(x), _sample_values(y)
+    pooled = np.concatenate([x, y]).astype(np.float64)
+    size, x_size = len(pooled), len(x)
+    block_rows = max(1, block_bytes // (16 * size))
+
+    observed = _differences(pooled, np.arange(x_size)[None, :], np.arange(x_size, size)[None, :], statistic)[0]
+    # Relabellings with the same multisets can sum in a different order, so compare with a tolerance
+    threshold = abs(observed) - 1e-12 * max(1.0, abs(observed))
+
+    exact = comb(size, x_size) <= max_exact
+    extreme = 0
+    if exact:
+        combinations = itertools.combinations(range(size), x_size)
+        total = comb(size, x_size)
+        while True:
+            block = list(itertools.islice(combinations, block_rows))
+            if not block:
+                break
+            x_indices = np.array(block, dtype=np.int64).reshape(len(block), x_size)
+            differences = _differences(pooled, x_indices, _complement(x_indices, size), statistic)
+            extreme += int((np.abs(differences) >= threshold).sum())
+        return observed, extreme / total, True
+
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_permutations, block_rows):
+        rows = min(block_rows, n_permutations - start)
+        shuffled = rng.permuted(np.tile(np.arange(size), (rows, 1)), axis=1)
+        differences = _differences(pooled, shuffled[:, :x_size], shuffled[:, x_size:], statistic)
+        extreme += int((np.abs(differences) >= threshold).sum())
+    # The observed labelling counts as one of the permutations
+    return observed, (extreme + 1) / (n_permutations + 1), False
+
+
+def _run_test(task):
+    x, y, options = task
+    return permutation_test(x, y, **options)
+
+
+# Permutation tests of many (x, y) groups; each group gets its own seed, and groups run on
+# separate processes when workers > 1
+def permutation_tests(groups, statistic='mean', n_permutations=9999, max_exact=100000, block_bytes=64 * 2 ** 20,
+                      seed=0, workers=1):
+    seeds = np.random.SeedSequence(seed).spawn(len(groups))
+    tasks = [(x, y, dict(statistic=statistic, n_permutations=n_permutations, max_exact=max_exact,
+                         block_bytes=block_bytes, seed=group_seed))
+             for (x, y), group_seed in zip(groups, seeds)]
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=fork_context()) as executor:
+            return list(executor.map(_run_test, tasks))
+    return [_run_test(task) for task in tasks]
+
+
+def format_permutation(result, statistic):
+    _, p_value, exact = result
+    return f"Permutation P-Value ({statistic}, {'exact' if exact else 'Monte Carlo'}): {p_value}"
@@ -1,111 +1,64 @@
+import os
+import sys
+import argparse
 import pandas as pd
-from scipy.stats import mannwhitneyu
 import numpy as np
 
-# Function to calculate Cohen's d for effect size
-def cohen_d(x, y):
-    nx = len(x)
-    ny = len(y)
-    dof = nx + ny - 2
-    pooled_std = np.sqrt(((nx - 1) * np.std(x, ddof=1) ** 2 + (ny - 1) * np.std(y, ddof=1) ** 2) / dof)
-    return (np.mean(x) - np.mean(y)) / pooled_std
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'RQ1'))
+from smell_distribution import load_distribution
+from count_histograms import save_shard, load_shards
+from group_comparison import add_comparison_arguments, parse_comparison_arguments, sample_types, compare_groups
 
-# Function to calculate Cliff's Delta
-def cliffs_delta(x, y):
-    nx = len(x)
-    ny = len(y)
-    greater = 0
-    less = 0
-    equal = 0
-    for i in x:
-        for j in y:
-            if i > j:
-                greater += 1
-            elif i < j:
-                less += 1
-            else:
-                equal += 1
-    delta = (greater - less) / (nx * ny)
-    return delta
+parser = argparse.ArgumentParser(description='Compare the code smell reductions of the LLM and the developers per code smell.')
+add_comparison_arguments(parser)
+args = parse_comparison_arguments(parser)
+new_sample, to_sample = sample_types(args.engine)
 
-# Read the CSV file
-csv_file = 'code_smell_type_distribution.csv'
-df = pd.read_csv(csv_file)
+if args.shards:
+    # Merge the histograms saved by earlier runs, e.g. one per model or batch of projects
+    llm_reductions, developer_reductions = load_shards(args.shards)
+else:
+    # Read the distribution (its Parquet edition when count_smell_types.py wrote one)
+    csv_file = 'code_smell_type_distribution.csv'
+    df = load_distribution(csv_file)
 
-# Filter data based on 'Project Folder'
-before_df = df[df['Project Folder'] == 'before_refactoring']
-llm_df = df[df['Project Folder'] == 'llm_refactoring']
-developer_df = df[df['Project Folder'] == 'developer_refactoring']
+    # Sum the counts of every (Type Name, Code Smell) pair per 'Project Folder' in one pass
+    folder_sums = df.groupby(['Type Name', 'Code Smell', 'Project Folder'], observed=True)['Code Smell Count'].sum()
+    pivot = folder_sums.unstack('Project Folder', fill_value=0)
+    pivot.columns = pivot.columns.astype(str)
+    pivot = pivot.reindex(columns=['before_refactoring', 'llm_refactoring', 'developer_refactoring'], fill_value=0)
 
-# Initialize a dictionary to store the reduction distributions and arrays for reductions
-reduction_distribution = {}
-llm_reductions = {}
-developer_reductions = {}
+    # Only the code smells a type has before refactoring are compared (none when there are no before rows)
+    before_rows = folder_sums.index.get_level_values('Project Folder') == 'before_refactoring'
+    before_pairs = folder_sums[before_rows].index.droplevel('Project Folder')
+    pivot = pivot.reindex(before_pairs)
 
-# Extract unique type names
-type_names = df['Type Name'].unique()
+    # Types in order of first appearance, code smells sorted within each type
+    type_order = {type_name: rank for rank, type_name in enumerate(df['Type Name'].unique())}
+    type_ranks = np.asarray(pivot.index.get_level_values('Type Name').map(type_order))
+    pivot = pivot.iloc[np.argsort(type_ranks, kind='stable')]
 
-# Process each type name
-for type_name in type_names:
-    reduction_distribution[type_name] = {}
-    
-    # Get code smell counts for 'before_smells'
-    before_counts = before_df[before_df['Type Name'] == type_name].groupby('Code Smell')['Code Smell Count'].sum()
-    
-    # Get code smell counts for 'llm_smells'
-    llm_counts = llm_df[llm_df['Type Name'] == type_name].groupby('Code Smell')['Code Smell Count'].sum()
-    
-    # Get code smell counts for 'developer_refactoring_smells'
-    developer_counts = developer_df[developer_df['Type Name'] == type_name].groupby('Code Smell')['Code Smell Count'].sum()
-    
-    # Calculate reductions
-    for code_smell in before_counts.index:
-        before_count = before_counts.get(code_smell, 0)
-        llm_count = llm_counts.get(code_smell, 0)
-        developer_count = developer_counts.get(code_smell, 0)
-        
-        llm_reduction = max(0, before_count - llm_count)
-        developer_reduction = max(0, before_count - developer_count)
-        
-        reduction_distribution[type_name][code_smell] = {
-            'before_count': before_count,
-            'llm_reduction': llm_reduction,
-            'developer_reduction': developer_reduction
-        }
-        
-        if code_smell not in llm_reductions:
-            llm_reductions[code_smell] = []
-        if code_smell not in developer_reductions:
-            developer_reductions[code_smell] = []
-        
-        llm_reductions[code_smell].append(llm_reduction)
-        developer_reductions[code_smell].append(developer_reduction)
+    # Reduction distribution: before counts and the clipped LLM and developer reductions per type and code smell
+    reduction_distribution = pd.DataFrame({
+        'before_count': pivot['before_refactoring'],
+        'llm_reduction': (pivot['before_refactoring'] - pivot['llm_refactoring']).clip(lower=0),
+        'developer_reduction': (pivot['before_refactoring'] - pivot['developer_refactoring']).clip(lower=0),
+    })
 
-# Prepare a list to save significant results
-significant_results = []
+    # Reduction samples (lists or histograms) per code smell, code smells in order of first appearance
+    llm_reductions = {}
+    developer_reductions = {}
+    for code_smell, reductions in reduction_distribution.groupby(level='Code Smell', sort=False, observed=True):
+        llm_reductions[code_smell] = to_sample(reductions['llm_reduction'])
+        developer_reductions[code_smell] = to_sample(reductions['developer_reduction'])
 
-# Perform Mann-Whitney U tests to determine if the difference between LLM and developer reductions is significant
-print("\nMann-Whitney U Test Results:")
-for code_smell in llm_reductions.keys():
-    llm_array = llm_reductions[code_smell]
-    developer_array = developer_reductions[code_smell]
-    
-    if len(llm_array) > 1 and len(developer_array) > 1:  # Ensure there are enough data points for the test
-        u_stat, p_value = mannwhitneyu(llm_array, developer_array, alternative='two-sided')
-        if p_value < 0.05:
-            if np.median(llm_array) > np.median(developer_array):
-                better = 'LLM'
-            else:
-                better = 'Developer'
-            effect_size = cohen_d(llm_array, developer_array)
-            delta = cliffs_delta(llm_array, developer_array)
-            result = f'Code Smell: {code_smell}, P-Value: {p_value}, Better: {better}, Effect Size (Cohen\'s d): {effect_size}, Cliff\'s Delta: {delta}'
-            significant_results.append(result)
-            print(result)
-        else:
-            print(f'Code Smell: {code_smell}, Result: No significant difference')
-    else:
-        print(f'Code Smell: {code_smell}, Result: Not enough data points for Mann-Whitney U test')
+if args.save_shard:
+    save_shard(args.save_shard, llm_reductions, developer_reductions)
+
+# Code smells in order of first appearance
+groups = {code_smell: (llm_reductions[code_smell], developer_reductions.get(code_smell, new_sample()))
+          for code_smell in llm_reductions}
+significant_results = compare_groups(groups, 'Code Smell', args)
 
 # Save the significant results to a text file
 output_file = 'significant_results.txt'
@@ -1,49 +1,22 @@
-import pandas as pd
 import json
-import numpy as np
-from scipy.stats import mannwhitneyu
+import argparse
 import os
+import sys
 
-# Function to calculate Cohen's d for effect size
-def cohen_d(x, y):
-    nx = len(x)
-    ny = len(y)
-    dof = nx + ny - 2
-    pooled_std = np.sqrt(((nx - 1) * np.std(x, ddof=1) ** 2 + (ny - 1) * np.std(y, ddof=1) ** 2) / dof)
-    return (np.mean(x) - np.mean(y)) / pooled_std
-
-# Function to calculate Cliff's Delta
-def cliffs_delta(x, y):
-    nx = len(x)
-    ny = len(y)
-    greater = 0
-    less = 0
-    equal = 0
-    for i in x:
-        for j in y:
-            if i > j:
-                greater += 1
-            elif i < j:
-                less += 1
-            else:
-                equal += 1
-    delta = (greater - less) / (nx * ny)
-    return delta
-
-# Load the JSON files
-with open('llm_refactoring_data.json', 'r') as llm_json_file:
-    llm_refactoring_data = json.load(llm_json_file)
-
-with open('dev_refactoring_data.json', 'r') as dev_json_file:
-    dev_refactoring_data = json.load(dev_json_file)
-
-# Read the CSV file
-csv_file = 'code_smell_type_distribution.csv'
-df = pd.read_csv(csv_file)
-
-# Initialize dictionaries to store the refactoring types distributions
-llm_refactoring_distribution = {}
-developer_refactoring_distribution = {}
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'RQ1'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'RQ2'))
+from smell_distribution import load_distribution
+from count_histograms import save_shard, load_shards
+from group_comparison import add_comparison_arguments, parse_comparison_arguments, sample_types, compare_groups
+
+parser = argparse.ArgumentParser(description='Compare the code smell reductions of the LLM and the developers per refactoring type.')
+add_comparison_arguments(parser)
+args = parse_comparison_arguments(parser)
+new_sample, _ = sample_types(args.engine)
+
+# Summed like the isin() mask did: every distinct type name once
+def sum_smells(sub_folder, project_folder, type_names):
+    return sum(smell_totals.get((sub_folder, project_folder, type_name), 0) for type_name in type_names)
 
 # Function to process refactoring data
 def process_refactoring_data(refactoring_data, distribution_dict, project_folder_name):
@@ -57,48 +30,59 @@ def process_refactoring_data(refactoring_data, distribution_dict, project_folder
         file_names = [os.path.basename(f).replace('.java', '') for f in files]
 
         sub_folder = f"{project_name}_smells"
-        project_data = df[(df['Sub Folder'] == sub_folder) & (df['Type Name'].isin(file_names))]
+        type_names = list(dict.fromkeys(file_names))
 
         # Debug statements to check why project_data might be empty
-        if project_data.empty:
+        if not any((sub_folder, type_name) in indexed_types for type_name in type_names):
             print(f"Project Data is empty for Project: {project_name}, Sub Folder: {sub_folder}, Files: {file_names}")
         else:
-            before_smells = project_data[project_data['Project Folder'] == 'before_refactoring']['Code Smell Count'].sum()
-            refactored_smells = project_data[project_data['Project Folder'] == project_folder_name]['Code Smell Count'].sum()
+            before_smells = sum_smells(sub_folder, 'before_refactoring', type_names)
+            refactored_smells = sum_smells(sub_folder, project_folder_name, type_names)
 
             smell_reduction = before_smells - refactored_smells
 
             if refactoring_type_entry not in distribution_dict:
-                distribution_dict[refactoring_type_entry] = []
+                distribution_dict[refactoring_type_entry] = new_sample()
 
             distribution_dict[refactoring_type_entry].append(smell_reduction)
 
-# Process both LLM and developer refactoring data
-process_refactoring_data(llm_refactoring_data, llm_refactoring_distribution, 'llm_refactoring')
-process_refactoring_data(dev_refactoring_data, developer_refactoring_distribution, 'developer_refactoring')
-
-# Prepare a list to save significant results
-significant_results = []
-
-# Perform Mann-Whitney U tests to determine if the difference between LLM and developer refactoring types is significant
-print("\nMann-Whitney U Test Results:")
-for refactoring_type in set(list(llm_refactoring_distribution.keys()) + list(developer_refactoring_distribution.keys())):
-    llm_array = llm_refactoring_distribution.get(refactoring_type, [])
-    developer_array = developer_refactoring_distribution.get(refactoring_type, [])
-    
-    if len(llm_array) > 1 and len(developer_array) > 1:  # Ensure there are enough data points for the test
-        u_stat, p_value = mannwhitneyu(llm_array, developer_array, alternative='two-sided')
-        if p_value < 0.05:
-            better = 'LLM' if np.median(llm_array) > np.median(developer_array) else 'Developer'
-            effect_size = cohen_d(llm_array, developer_array)
-            delta = cliffs_delta(llm_array, developer_array)
-            result = f'Refactoring Type: {refactoring_type}, P-Value: {p_value}, Better: {better}, Effect Size (Cohen\'s d): {effect_size}, Cliff\'s Delta: {delta}'
-            significant_results.append(result)
-            print(result)
-        else:
-            print(f'Refactoring Type: {refactoring_type}, Result: No significant difference')
-    else:
-        print(f'Refactoring Type: {refactoring_type}, Result: Not enough data points for Mann-Whitney U test')
+if args.shards:
+    # Merge the histograms saved by earlier runs, e.g. one per model or batch of projects
+    llm_refactoring_distribution, developer_refactoring_distribution = load_shards(args.shards)
+else:
+    # Load the JSON files
+    with open('llm_refactoring_data.json', 'r') as llm_json_file:
+        llm_refactoring_data = json.load(llm_json_file)
+
+    with open('dev_refactoring_data.json', 'r') as dev_json_file:
+        dev_refactoring_data = json.load(dev_json_file)
+
+    # Read the distribution (its Parquet edition when count_smell_types.py wrote one)
+    csv_file = 'code_smell_type_distribution.csv'
+    df = load_distribution(csv_file)
+
+    # Index the distribution once: smell totals per (Sub Folder, Project Folder, Type Name), and the
+    # (Sub Folder, Type Name) pairs that have any row at all
+    smell_totals = df.groupby(['Sub Folder', 'Project Folder', 'Type Name'], observed=True)['Code Smell Count'].sum()
+    smell_totals = dict(zip(smell_totals.index, smell_totals.tolist()))
+    indexed_types = set(zip(df['Sub Folder'], df['Type Name']))
+
+    # Initialize dictionaries to store the refactoring types distributions
+    llm_refactoring_distribution = {}
+    developer_refactoring_distribution = {}
+
+    # Process both LLM and developer refactoring data
+    process_refactoring_data(llm_refactoring_data, llm_refactoring_distribution, 'llm_refactoring')
+    process_refactoring_data(dev_refactoring_data, developer_refactoring_distribution, 'developer_refactoring')
+
+if args.save_shard:
+    save_shard(args.save_shard, llm_refactoring_distribution, developer_refactoring_distribution)
+
+# LLM and developer samples of every refactoring type either side has
+groups = {group: (llm_refactoring_distribution.get(group, new_sample()), developer_refactoring_distribution.get(group, new_sample()))
+          for group in set(list(llm_refactoring_distribution.keys()) + list(developer_refactoring_distribution.keys()))}
+
+significant_results = compare_groups(groups, 'Refactoring Type', args)
 
 # Save the significant results to a text file
 output_file = 'significant_results_refactorings.txt'
@@ -1,27 +1,55 @@
 import os
 import json
 import csv
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'RQ1'))
+from dataset_index import iter_records
+from dataset_columnar import columnar_edition, iter_file_rows
+
+def iter_commits_without_code(jsonl_file):
+    parquet_path = columnar_edition(jsonl_file)
+    if parquet_path is None:
+        yield from iter_records(jsonl_file)
+        return
+
+    # The columnar edition lets us skip the before/after code entirely
+    columns = ["line_number", "project", "commit_sha", "file_name", "refactoring_types", "refactoring_counts"]
+    current_line, entry = None, None
+    for row in iter_file_rows(parquet_path, columns):
+        if row['line_number'] != current_line:
+            if entry is not None:
+                yield entry
+            current_line = row['line_number']
+            entry = {
+                'project': row['project'],
+                'commit_sha': row['commit_sha'],
+                'refactoring_types': dict(zip(row['refactoring_types'], row['refactoring_counts'])),
+                'files': []
+            }
+        if row['file_name'] is not None:
+            entry['files'].append({'file_name': row['file_name']})
+    if entry is not None:
+        yield entry
 
 def extract_developer_refactorings(jsonl_file):
     data = []
     
-    with open(jsonl_file, 'r') as f:
-        for line in f:
-            entry = json.loads(line)
-            project_name = entry['project']
-            commit_sha = entry['commit_sha']
-            refactoring_types = entry['refactoring_types']
-            files = entry['files']
-
-            # Extract refactoring types and associated file names
-            for refactoring_type, count in refactoring_types.items():
-                data.append({
-                    "project_name": project_name,
-                    "commit_sha": commit_sha,
-                    "files": [file['file_name'] for file in files],
-                    "refactoring_type": refactoring_type,
-                    "count": count
-                })
+    for entry in iter_commits_without_code(jsonl_file):
+        project_name = entry['project']
+        commit_sha = entry['commit_sha']
+        refactoring_types = entry['refactoring_types']
+        files = entry['files']
+
+        # Extract refactoring types and associated file names
+        for refactoring_type, count in refactoring_types.items():
+            data.append({
+                "project_name": project_name,
+                "commit_sha": commit_sha,
+                "files": [file['file_name'] for file in files],
+                "refactoring_type": refactoring_type,
+                "count": count
+            })
     
     return data
 
@@ -1,23 +1,40 @@
-import torch
 import json
 import os
 import sys
-import time
-from transformers import AutoTokenizer, AutoModelForCausalLM
-from datasets import load_dataset
 import argparse
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'RQ1'))
+from dataset_index import JsonlReader
+from resume import load_completed_keys
+from backends import HFBackend, CompletionServerBackend, run_async
+from generation_cache import GenerationCache, CachedGeneration
+from early_stopping import EarlyStopping
+
 def main():
     parser = argparse.ArgumentParser(description='Run Starcoder refactoring.')
-    parser.add_argument('--device', type=str, required=True, help='Device to use, e.g., "cuda:0"')
-    parser.add_argument('--start_line', type=int, required=True, help='Line number to start processing from')
+    parser.add_argument('--device', type=str, default='cpu', help='Device to use, e.g., "cuda:0"')
+    parser.add_argument('--start_line', type=int, default=0, help='Line number to start processing from')
     parser.add_argument('--output_file', type=str, required=True, help='Path to the output file')
+    parser.add_argument('--resume', action='store_true', help='Skip files whose results are already in the output file')
+    parser.add_argument('--prefix_cache', action='store_true', help='Prefill the shared system prompt once and reuse its KV cache for every prompt')
+    parser.add_argument('--model_id', type=str, default='bigcode/starcoder2-15b', help='Model to generate with')
+    parser.add_argument('--early_stopping', action='store_true',
+                        help='Stop generating when a prompt header reappears or the code\'s braces close as often as in the input')
+    parser.add_argument('--time_budget', type=float, default=None, help='With --early_stopping, maximum seconds of generation per sample')
+    parser.add_argument('--backend', type=str, default='hf', choices=['hf', 'openai'],
+                        help='Generate in-process with Hugging Face or through an OpenAI-compatible completion server')
+    parser.add_argument('--api_base', type=str, default='http://127.0.0.1:8000', help='Base URL of the completion server')
+    parser.add_argument('--generation_cache', type=str, default=None,
+                        help='SQLite file caching responses by model, prompt and decoding settings; repeated prompts are served from it')
+    parser.add_argument('--concurrency', type=int, default=16, help='Maximum concurrent requests to the completion server')
     parser.add_argument('--mode', type=str, required=True, choices=['chain_of_thought', 'one_shot'], 
                         help='Mode of prompt generation: chain of thought or one-shot')
 
     args = parser.parse_args()
+    if args.backend == 'openai' and args.prefix_cache:
+        parser.error('--prefix_cache only applies to the hf backend')
 
-    model_id = "bigcode/starcoder2-15b"
+    model_id = args.model_id
     device = args.device
     start_line = args.start_line
     output_file_path = args.output_file
@@ -30,19 +47,33 @@ def main():
     SYSTEM_PROMPT = DEFAULT_SYSTEM_PROMPT
     B_SYS, E_SYS = "<<SYS>>\n", "\n<</SYS>>\n\n"
 
-    tokenizer = AutoTokenizer.from_pretrained(model_id)
-    model = AutoModelForCausalLM.from_pretrained(model_id).to(device)
+    early_stopping = EarlyStopping(args.time_budget) if args.early_stopping else None
+    decoding_params = {"max_new_tokens": 600, "do_sample": False}
+    if early_stopping is not None:
+        decoding_params.update(early_stopping.params())
+
+    if args.backend == 'openai':
+        stop = early_stopping.markers if early_stopping else None
+        backend = CompletionServerBackend(args.api_base, model_id, concurrency=args.concurrency, stop=stop)
+    else:
+        prefix = f"{B_SYS}{SYSTEM_PROMPT}{E_SYS}" if args.prefix_cache else None
+        backend = HFBackend(model_id, device, prefix=prefix, early_stopping=early_stopping)
 
     output_dir = os.path.dirname(output_file_path)
     if output_dir and not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    with open("test_java.jsonl", "r") as test_file, open(output_file_path, "a") as results_file:
-        lines = test_file.readlines()
-        for i in range(start_line, len(lines)):
-            data = json.loads(lines[i])
+    completed_keys = load_completed_keys(output_file_path) if args.resume else set()
+    if completed_keys:
+        print(f"Resuming: {len(completed_keys)} files already in {output_file_path}")
+
+    def iter_work_items(test_file):
+        for i, data in test_file.iter_from(start_line):
             before_code = data['before_refactoring']
 
+            if (data['project'], data['commit_sha'], data['file_name']) in completed_keys:
+                continue
+
             if mode == 'chain_of_thought':
                 pre_prompt = f"""# Suggested refactoring types:
 {data.get('suggested_refactorings', 'List of refactoring types developers performed on this commit with definitions')}
@@ -60,35 +91,61 @@ def main():
 """
 
             prompt = f"{B_SYS}{SYSTEM_PROMPT}{E_SYS}{pre_prompt}"
-            print(prompt)
-
-            tokens = tokenizer.encode(prompt, return_tensors="pt").to(device)
-
-            torch.cuda.empty_cache()
-
-            start_time = time.time()
-            print("Generating output")
-            outputs = model.generate(tokens, max_new_tokens=600, pad_token_id=tokenizer.eos_token_id, eos_token_id=tokenizer.eos_token_id)
-            end_time = time.time()
-            generation_time = end_time - start_time
-            print(f"Generation time: {generation_time}")
-
-            for j in range(len(outputs)):
-                new_tokens = outputs[j][tokens.shape[-1]:]  # Generated tokens
-                response = tokenizer.decode(new_tokens, skip_special_tokens=True).strip()
-
-                # Ensure the response does not include the prompt or repetition
-                response = response.replace(prompt.strip(), "").strip()
-
-                results = {
-                    "project": data['project'],
-                    "commit_sha": data['commit_sha'],
-                    "file_name": data['file_name'],
-                    "input": before_code,
-                    "generated_response": response,
-                    "generation_time": generation_time
-                }
-                results_file.write(json.dumps(results) + "\n")
+            yield {"data": data, "before_code": before_code, "prompt": prompt}
+
+    def write_result(results_file, item, response, generation_time, telemetry=None):
+        data = item["data"]
+
+        # Ensure the response does not include the prompt or repetition
+        response = response.strip().replace(item["prompt"].strip(), "").strip()
+
+        results = {
+            "project": data['project'],
+            "commit_sha": data['commit_sha'],
+            "file_name": data['file_name'],
+            "input": item["before_code"],
+            "generated_response": response,
+            "generation_time": generation_time
+        }
+        if telemetry is not None:
+            results["telemetry"] = telemetry
+        results_file.write(json.dumps(results) + "\n")
+        results_file.flush()
+
+    cached_generation = None
+    if args.generation_cache:
+        cached_generation = CachedGeneration(GenerationCache(args.generation_cache), model_id, decoding_params)
+
+    with JsonlReader("test_java.jsonl") as test_file, open(output_file_path, "a") as results_file:
+        def on_result(item, response, generation_time, telemetry=None):
+            write_result(results_file, item, response, generation_time, telemetry)
+            if cached_generation is not None:
+                for duplicate in cached_generation.complete(item, response, generation_time):
+                    write_result(results_file, duplicate, response, generation_time)
+
+        items = iter_work_items(test_file)
+        if cached_generation is not None:
+            items = cached_generation.filter(items, lambda *result: write_result(results_file, *result))
+
+        def on_error(item, error):
+            failed = [item] + (cached_generation.fail(item) if cached_generation is not None else [])
+            for failed_item in failed:
+                data = failed_item["data"]
+                print(f"Generation failed for file {data['file_name']} in commit {data['commit_sha']}: {error!r}")
+
+        if args.backend == 'openai':
+            failures = run_async(backend, items, 600, on_result, on_error)
+            if failures:
+                print(f"{failures} prompts failed and were not written; run again with --resume to retry them")
+        else:
+            for item in items:
+                print(item["prompt"])
+
+                print("Generating output")
+                response, generation_time, telemetry = backend.generate(item["prompt"], 600, item["before_code"])
+                print(f"Generation time: {generation_time}")
+
+                on_result(item, response, generation_time, telemetry)
 
 if __name__ == "__main__":
     main()